@@ -0,0 +1,80 @@
+import threading
+
+from collections import OrderedDict
+from collections.abc import Callable
+from typing import Generic, Hashable, TypeVar
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class LRUCache(Generic[K, V]):
+    """Thread-safe in-process cache that drops the least recently used items
+    once it holds more than `max_items`, or more than `max_bytes` as measured by
+    `size` when both are given. Items larger than `max_bytes` are not kept."""
+
+    def __init__(
+        self,
+        max_items: int = 8,
+        max_bytes: int | None = None,
+        size: Callable[[V], int] | None = None,
+    ) -> None:
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.nbytes = 0
+        self._items: OrderedDict[K, V] = OrderedDict()
+        self._sizes: dict[K, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: K) -> V | None:
+        with self._lock:
+            if key not in self._items:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._items.move_to_end(key)
+            return self._items[key]
+
+    def set(self, key: K, value: V) -> None:
+        size = self.size(value) if self.size is not None else 0
+        with self._lock:
+            if key in self._items:
+                del self._items[key]
+                self.nbytes -= self._sizes.pop(key, 0)
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            self._items[key] = value
+            if self.size is not None:
+                self._sizes[key] = size
+                self.nbytes += size
+            while self._items and (
+                len(self._items) > self.max_items
+                or (self.max_bytes is not None and self.nbytes > self.max_bytes)
+            ):
+                evicted, _ = self._items.popitem(last=False)
+                self.nbytes -= self._sizes.pop(evicted, 0)
+                self.evictions += 1
+
+    def __contains__(self, key: object) -> bool:
+        with self._lock:
+            return key in self._items
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def remove_if(self, predicate: Callable[[K], bool]) -> None:
+        """Remove the items whose key matches the predicate."""
+        with self._lock:
+            for key in [key for key in self._items if predicate(key)]:
+                del self._items[key]
+                self.nbytes -= self._sizes.pop(key, 0)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._items.clear()
+            self._sizes.clear()
+            self.nbytes = 0
@@ -1,38 +1,209 @@
 import viktor as vkt  # type: ignore
-import json
+import hashlib
+import logging
 import plotly.graph_objects as go
 
+from collections.abc import Iterator
+from concurrent.futures import Future, ThreadPoolExecutor
 from textwrap import dedent
-from app.tools.render_scene import default_blank_scene
-from app.llm_engine import llm_response, execute_tool
-from app.tools.render_scene import plot_3d_scene
-from app.parse_xlsx import get_entities
-from app.models import Entities, memoize_corrector
-from typing import Literal
+from app import figure_json
+from app.cache import LRUCache
+from app.tools.render_scene import Scene, SceneGeometry, SceneOverlay, ViewDocument, default_blank_scene
+from app.llm_engine import (
+    Response,
+    llm_response_stream,
+    execute_tool,
+    tool_ready,
+    model_scene,
+    prompt_cache_usage,
+    WARMUP_STEPS,
+)
+from app.prewarm import get_warmup, start_warmup, warm_result
+from app.entities import Entities, cached_entities, load_entities, export_model
+from app.model_file import MODEL_FILE_SUFFIX
+from typing import Any, Literal
 
+logger = logging.getLogger(__name__)
 
-def store_scene(figure: go.Figure, view_name: Literal["view"] = "view") -> None:
+# Chat reply when a response or its tool fails, the error itself is logged.
+CHAT_ERROR_MESSAGE = "Sorry, something went wrong while answering your question. Please try again."
+
+# Storage key prefix of the geometry payloads of the 3D scenes, one per model geometry.
+SCENE_GEOMETRY_PREFIX = "scene-geometry-"
+# Geometry payloads stored or read by this process, keyed by SceneGeometry.key.
+_scene_geometries: LRUCache[str, SceneGeometry] = LRUCache(max_items=4)
+# Plotly JSON of the 3D scenes composed by this process, keyed by the hash of their stored view.
+_composed_views: LRUCache[str, str] = LRUCache(max_items=4)
+# (entity id, hash of the uploaded file) of the base 3D scenes this process stored as
+# the view of an entity, only its current upload is kept per entity.
+_base_scene_uploads: LRUCache[tuple[Any, str], bool] = LRUCache(max_items=64)
+
+
+def store_scene_geometry(geometry: SceneGeometry) -> None:
+    """Store the geometry payload of 3D scenes once per model, and remove the
+    payloads of previously uploaded models."""
+    storage = vkt.Storage()
+    stored = storage.list(scope="entity")
+    if SCENE_GEOMETRY_PREFIX + geometry.key not in stored:
+        storage.set(
+            SCENE_GEOMETRY_PREFIX + geometry.key,
+            data=vkt.File.from_data(geometry.to_json()),
+            scope="entity",
+        )
+    model_hash = geometry.key.rsplit("-", 1)[0]
+    for key in stored:
+        if key.startswith(SCENE_GEOMETRY_PREFIX) and not key.startswith(SCENE_GEOMETRY_PREFIX + model_hash):
+            storage.delete(key, scope="entity")
+    _scene_geometries.set(geometry.key, geometry)
+
+
+def load_scene_geometry(key: str) -> SceneGeometry:
+    """Geometry payload of 3D scenes stored by `store_scene_geometry`."""
+    geometry = _scene_geometries.get(key)
+    if geometry is None:
+        raw = vkt.Storage().get(SCENE_GEOMETRY_PREFIX + key, scope="entity").getvalue()
+        geometry = SceneGeometry.from_json(raw)
+        _scene_geometries.set(key, geometry)
+    return geometry
+
+
+def store_scene(figure: ViewDocument | Scene | go.Figure, view_name: Literal["view"] = "view") -> None:
     """This function stores the output of a tool call in
     the vkt.Storage object. The storage object can be used to communicate
-    between views."""
+    between views. Figures are stored as compact Plotly JSON (see app.figure_json).
+    A 3D scene is stored as its result overlay and the key of its geometry, which is
+    stored once per model, so it is small for any model size."""
+    view = figure if isinstance(figure, ViewDocument) else ViewDocument.from_figure(figure)
+    if view.geometry is not None:
+        store_scene_geometry(view.geometry)
     vkt.Storage().set(
         view_name,
-        data=vkt.File.from_data(figure.to_json().encode()),
+        data=vkt.File.from_data(view.document),
         scope="entity",
     )
 
 
-@memoize_corrector(Entities)
+def load_view(raw: bytes) -> str:
+    """Plotly JSON of a view stored by `store_scene`. Figures are passed on as they
+    were stored, 3D scenes are composed from their geometry and overlay once per
+    stored view in this process."""
+    document = figure_json.text(raw)
+    if not document.startswith('{"scene":'):
+        return document
+    view_key = hashlib.sha256(raw).hexdigest()
+    composed = _composed_views.get(view_key)
+    if composed is None:
+        data = figure_json.loads(raw, arrays=True)["scene"]
+        scene = Scene(load_scene_geometry(data["geometry"]), SceneOverlay.from_dict(data["overlay"]))
+        composed = figure_json.figure_text(scene.figure())
+        _composed_views.set(view_key, composed)
+    return composed
+
+
+def store_base_scene(entities: Entities, entity_id: Any = None) -> None:
+    """Store the 3D scene of the model as the view once per uploaded file, so later
+    chat turns only write to Storage when a tool produces a new figure. Without an
+    entity id the scene is stored on every call."""
+    key = (entity_id, entities.content_hash)
+    if entity_id is not None and _base_scene_uploads.get(key):
+        return
+    store_scene(model_scene(entities))
+    if entity_id is not None:
+        forget_base_scene(entity_id)
+        _base_scene_uploads.set(key, True)
+
+
+def forget_base_scene(entity_id: Any) -> None:
+    """Forget the base 3D scene stored as the view of an entity."""
+    _base_scene_uploads.remove_if(lambda key: key[0] == entity_id)
+
+
+def base_scene_view(entities: Entities) -> str:
+    """Plotly JSON of the 3D scene of the model, composed once per uploaded file
+    (by its warm-up when it has one)."""
+    warm_view = warm_result(entities, "base_scene")
+    if warm_view is not None:
+        return warm_view
+    view_key = f"model-{entities.content_hash}"
+    composed = _composed_views.get(view_key)
+    if composed is None:
+        composed = figure_json.figure_text(model_scene(entities).figure())
+        _composed_views.set(view_key, composed)
+    return composed
+
+
+def _open_upload(file) -> Entities:
+    # Stream the upload, large files are spooled to disk instead of held in memory.
+    with file.file.open_binary() as file_content:
+        return load_entities(file_content)
+
+
 @vkt.memoize
+def upload_hash(file) -> str:
+    """Hash of the content of an uploaded file, memoized per upload so later calls
+    find its entities without reading or hashing the file again."""
+    return _open_upload(file).content_hash
+
+
 def read_file_binary(file) -> Entities:
-    """Memoized wrapper for processing the input .xlsx file.
-    Returns:
-        nodes_dict, frame_dicts, section_dicts, comb_forces_dict, joint_disp_dict, list_load_combs
-    See app.models for data structure definitions.
+    """Cached wrapper for processing the input .xlsx (or .csv zip, native model) file.
+    Returns the lazily parsed entities of the model, each field is only read
+    from the sheets it needs when a tool first uses it. The upload is only opened
+    when its entities are not loaded in this process yet.
+    See app.entities and app.models for data structure definitions.
     """
-    xlsx_file = file.file
-    file_content = xlsx_file.getvalue_binary()
-    return Entities(*get_entities(file_content=file_content))
+    entities = cached_entities(upload_hash(file))
+    if entities is None:
+        # Loaded by another process, or evicted from the cache of this one.
+        entities = _open_upload(file)
+    return entities
+
+
+def warm_up_upload(file) -> Entities:
+    """Entities of an upload with their background warm-up started, once per upload
+    hash (see app.prewarm). VIKTOR has no upload hook, the view is rendered again
+    after each upload, so `get_plotly_view` is the only caller."""
+    entities = read_file_binary(file)
+    start_warmup(entities, WARMUP_STEPS)
+    return entities
+
+
+# Runs the selected tool of a streamed response while the rest of it is generated.
+_tool_executor = ThreadPoolExecutor(max_workers=4, thread_name_prefix="tool")
+
+
+def stream_chat(responses: Iterator[Response], entities: Entities | None) -> Iterator[str]:
+    """Text of the streamed responses of the LLM as it grows, for `vkt.ChatResult`.
+    With a model, the selected tool is started as soon as it is complete, and its
+    output is stored for the view once both the text and the tool are done."""
+    sent = ""
+    tool_call: Future | None = None
+    tool_checked = False
+    final: Response | None = None
+    try:
+        for partial in responses:
+            final = partial
+            if entities is not None and not tool_checked and tool_ready(partial):
+                tool_checked = True
+                if partial.selected_tool is not None:
+                    tool_call = _tool_executor.submit(execute_tool, partial, entities)
+            text = partial.response or ""
+            if text.startswith(sent) and len(text) > len(sent):
+                yield text[len(sent):]
+                sent = text
+        if final is None:
+            raise ValueError("The LLM returned no parsed response.")
+        if entities is not None:
+            # Tools of responses that did not stream the tool first run now.
+            _, generated_fig = tool_call.result() if tool_call else execute_tool(final, entities)
+            # Generated_fig is the output of a function call.
+            # If there is no function call execution, then it is None.
+            if generated_fig:
+                # Store function call output in memory
+                store_scene(generated_fig)
+    except Exception:
+        logger.exception("Error processing user query")
+        yield f"\n\n{CHAT_ERROR_MESSAGE}" if sent else CHAT_ERROR_MESSAGE
 
 
 class Parametrization(vkt.Parametrization):
@@ -41,10 +212,13 @@ class Parametrization(vkt.Parametrization):
         # Talk With Your ETABS Model
         Export your model's results in `.xlsx` format from ETABS,
         click on the file loader below, and upload the `.xlsx` file.
+        A `.zip` of the same tables exported as `.csv` files loads faster.
+        Download the parsed model as a `.twym` file to open it instantly next time.
         """)
     )
     chat = vkt.Chat("## AI Agent", method="call_llm")
-    xlsx_file = vkt.FileField("**Upload a .xlsx file:**", flex=100)
+    xlsx_file = vkt.FileField("**Upload a .xlsx, .zip (.csv tables) or .twym file:**", flex=100)
+    download_model = vkt.DownloadButton("Download model file", method="download_model_file")
     conversation_history = vkt.HiddenField(
         name="conversation_history", ui_name="conversation_history"
     )
@@ -63,78 +237,108 @@ class Controller(vkt.Controller):
             # Parse entities from the Excel
             entities = read_file_binary(params.xlsx_file)
             payload = entities
-            # Create a 3D scene
-            fig = plot_3d_scene(payload.nodes, payload.frames)
-            # Save fig in memory this acts as hook to send the figure
-            # to the PLotlyView
-            store_scene(fig)
+            # Save the 3D scene of a new upload in memory, this acts as hook to
+            # send the figure to the PLotlyView
+            store_base_scene(payload, kwargs.get("entity_id"))
 
         # Conversation loop + function calls
         if conversation_history:
             try:
                 if conversation_history[-1]["role"] == "user":
                     if payload:
-                        # Send conversation history to the LLM
-                        response = llm_response(
+                        # Stream the response to the chat, running the tool meanwhile
+                        responses = llm_response_stream(
                             ctx=payload.model_context,
                             conversation_history=conversation_history,
                             file_status="File Uploaded",
                         )
-                        # Process response
-                        if response:
-                            llm_message, generated_fig = execute_tool(
-                                response=response, entities=payload
-                            )
-                            # Generated_fig is the output of a function call.
-                            # If there is no function call execution, then it is None.
-                            if generated_fig:
-                                fig2 = generated_fig
-                                # Store function call output in memory
-                                store_scene(fig2)
-                            return vkt.ChatResult(params.chat, llm_message)
-                        else:
-                            raise ValueError("The LLM returned no parsed response.")
-
                     # No payload -> No model ctx.
                     else:
-                        response = llm_response(
+                        responses = llm_response_stream(
                             conversation_history=conversation_history,
                             ctx="No model uploaded!",
                         )
+                    return vkt.ChatResult(params.chat, stream_chat(responses, payload))
 
-                        if response:
-                            return vkt.ChatResult(params.chat, response.response)
-                        else:
-                            raise ValueError("The LLM returned no parsed reponse.")
+            except Exception:
+                logger.exception("Error processing user query")
+                return vkt.ChatResult(params.chat, CHAT_ERROR_MESSAGE)
 
-            except Exception as e:
-                print(f"Error processing user query: {e}")
+    def download_model_file(self, params, **kwargs) -> vkt.DownloadResult:
+        """Export the parsed model as a native, memory-mappable model file."""
+        if not params.xlsx_file:
+            raise vkt.UserError("Upload a model file first.")
+        entities = read_file_binary(params.xlsx_file)
+        file_name = params.xlsx_file.filename.rsplit(".", 1)[0] + MODEL_FILE_SUFFIX
+        return vkt.DownloadResult(export_model(entities), file_name)
+
+    @vkt.DataView("Model status", duration_guess=1)
+    def get_model_status(self, params, **kwargs) -> vkt.DataResult:
+        """Progress of the background warm-up of the uploaded model, and the sheets
+        of the upload that were reused from the parse cache or parsed again."""
+        if not params.xlsx_file:
+            return vkt.DataResult(vkt.DataGroup(vkt.DataItem("Model", "No model uploaded")))
+        entities = read_file_binary(params.xlsx_file)
+        report = entities.ingest_report()
+        sheet_items = [
+            vkt.DataItem(
+                label,
+                len(sheets),
+                subgroup=vkt.DataGroup(*(vkt.DataItem(sheet, "") for sheet in sheets)),
+            )
+            for label, sheets in (("Reused sheets", report["reused"]), ("Reparsed sheets", report["reparsed"]))
+        ]
+        warmup = get_warmup(entities.content_hash)
+        if warmup is None:
+            return vkt.DataResult(vkt.DataGroup(vkt.DataItem("Model", "Loaded on demand"), *sheet_items))
+        progress = warmup.progress()
+        status = {
+            "loading": vkt.DataStatus.INFO,
+            "ready": vkt.DataStatus.SUCCESS,
+            "failed": vkt.DataStatus.WARNING,
+        }[progress["state"]]
+        return vkt.DataResult(vkt.DataGroup(
+            vkt.DataItem(
+                "Model",
+                "Model loading" if progress["state"] == "loading" else progress["state"].capitalize(),
+                status=status,
+                status_message=", ".join(progress["failed"]),
+            ),
+            vkt.DataItem("Step", progress["step"] or "-"),
+            vkt.DataItem("Progress", f"{progress['done']} / {progress['total']}"),
+            *sheet_items,
+            vkt.DataItem(
+                "Cached prompt tokens",
+                f"{prompt_cache_usage['cached_tokens']} / {prompt_cache_usage['prompt_tokens']}",
+            ),
+        ))
 
     @vkt.PlotlyView("Plotting Tool", width=100)
     def get_plotly_view(self, params, **kwargs) -> vkt.PlotlyResult:
         """This view plots the output of a tool call in a Plotly view.
-        All tool calls are go.Figures exported as JSON. They are saved in
+        All tool calls are go.Figures (or 3D scenes) exported as JSON. They are saved in
         Storage and retrieved here."""
-        # 1. Delete tools calls from storage if there is no .xlsx file
+        # 1. Delete tools calls (and scene geometries) from storage if there is no .xlsx file
         if not params.xlsx_file:
             entities = vkt.Storage().list(scope="entity")
             for entity in entities:
-                if entity == "view":
-                    vkt.Storage().delete("view", scope="entity")
+                if entity == "view" or entity.startswith(SCENE_GEOMETRY_PREFIX):
+                    vkt.Storage().delete(entity, scope="entity")
+            _scene_geometries.clear()
+            forget_base_scene(kwargs.get("entity_id"))
+        else:
+            # The view is rendered again on upload: start the warm-up of a new model.
+            warm_up_upload(params.xlsx_file)
 
         # 2. Try to get the previous view from the tool call, otherwise plot the model!
         try:
             raw = vkt.Storage().get("view", scope="entity").getvalue()
-            fig = go.Figure(json.loads(raw))
+            return vkt.PlotlyResult(load_view(raw))
         except Exception:
             # If there is no uploaded .xlsx file, then a blank view is plotted.
             if params.xlsx_file:
                 # Parse entities from the Excel
                 entities = read_file_binary(params.xlsx_file)
-                payload = entities
-                # Create a 3D scene for fig1
-                fig = plot_3d_scene(payload.nodes, payload.frames)
-            else:
-                fig = default_blank_scene()
-
-        return vkt.PlotlyResult(fig.to_json())
+                # The 3D scene of the model, composed once per upload
+                return vkt.PlotlyResult(base_scene_view(entities))
+            return vkt.PlotlyResult(figure_json.figure_text(default_blank_scene()))
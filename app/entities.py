@@ -0,0 +1,251 @@
+import json
+import hashlib
+import logging
+import threading
+import pandas as pd  # type: ignore
+
+from collections.abc import Callable, Mapping
+from functools import cached_property
+from typing import Any, BinaryIO
+from app.cache import LRUCache
+from app.geometry import Geometry, StationMesh
+from app.models import Node, Frame
+from app.model_file import ModelFile, encode_model, is_model_file, open_model_file, MAGIC
+from app.parse_cache import ParseCache, default_parse_cache
+from app.parse_csv import CsvTables, is_csv_zip, open_csv_tables
+from app.parse_xlsx import (
+    Workbook,
+    sheet_names,
+    open_workbook,
+    get_geometry,
+    get_sections,
+    get_internal_loads,
+    get_displacements,
+    get_load_combos,
+    get_reactions,
+    get_model_ctx,
+)
+from app.results import Envelope, InternalForces, JointDisplacements, JointReactions
+
+logger = logging.getLogger(__name__)
+
+# Lazy sheet sources of the upload formats, with fingerprints and prefetch.
+SHEET_SOURCES = (Workbook, CsvTables)
+
+
+# Sheets each field of Entities is parsed from.
+FIELD_SHEETS: dict[str, list[str]] = {
+    "geometry": ["Objects and Elements - Joints", "Beam Object Connectivity", "Column Object Connectivity"],
+    "sections": ["Frame Assigns - Sect Prop"],
+    "internal_loads": ["Element Forces - Beams", "Element Forces - Columns"],
+    "joints_disp": ["Joint Displacements"],
+    "list_load_combos": ["Element Joint Forces - Frame"],
+    "reactions": ["Joint Reactions", "Objects and Elements - Joints"],
+    "force_envelope": ["Element Forces - Beams", "Element Forces - Columns"],
+    "disp_envelope": ["Joint Displacements"],
+    "reaction_envelope": ["Joint Reactions", "Objects and Elements - Joints"],
+    "station_mesh": [
+        "Objects and Elements - Joints",
+        "Beam Object Connectivity",
+        "Column Object Connectivity",
+        "Element Forces - Beams",
+        "Element Forces - Columns",
+    ],
+    "model_context": [
+        "Modal Periods And Frequencies",
+        "Material List by Section Prop",
+        "Element Joint Forces - Frame",
+    ],
+}
+
+# Fields computed from other fields rather than from sheets: field -> source fields.
+DERIVED_FIELDS: dict[str, tuple[str, ...]] = {
+    "force_envelope": ("internal_loads",),
+    "disp_envelope": ("joints_disp",),
+    "reaction_envelope": ("reactions",),
+    "station_mesh": ("geometry", "internal_loads"),
+}
+
+
+class Entities:
+    """Entities of an uploaded ETABS model.
+
+    Each field is parsed on first access from only the sheets it needs and then
+    cached, e.g. the model context never reads the element forces sheets. Parsed
+    fields are also stored in the on-disk `parse_cache` under the fingerprints of
+    their sheets, so other worker processes, restarts and revised uploads in which
+    those sheets did not change reuse them without parsing.
+    Entities opened from a native model file map their fields from it instead.
+    Each field has its own lock, so a caller that needs a field being computed by
+    another thread (see app.prewarm) waits for it and reuses it, while other fields
+    are computed meanwhile.
+    """
+
+    def __init__(
+        self,
+        sheets_data: Mapping[str, pd.DataFrame],
+        content_hash: str = "",
+        parse_cache: ParseCache | None = None,
+        model_file: ModelFile | None = None,
+    ) -> None:
+        self.sheets_data = sheets_data
+        self.content_hash = content_hash
+        self.parse_cache = parse_cache if content_hash else None
+        self.model_file = model_file
+        self.reused_fields: list[str] = []
+        self._values: dict[str, Any] = {}
+        self._locks: dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+
+    def _field_key(self, field: str) -> str:
+        """Cache key of a field: the fingerprints of its sheets, or the upload hash
+        when they are not available."""
+        fingerprints = self.sheets_data.fingerprints if isinstance(self.sheets_data, SHEET_SOURCES) else {}
+        if not all(sheet in fingerprints for sheet in FIELD_SHEETS[field]):
+            return self.content_hash
+        key = json.dumps([field, [fingerprints[sheet] for sheet in FIELD_SHEETS[field]]])
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _field(self, field: str, parse: Callable[[], Any]) -> Any:
+        """Value of a field, computed once by the first thread that needs it."""
+        with self._locks_guard:
+            lock = self._locks.setdefault(field, threading.Lock())
+        with lock:
+            if field not in self._values:
+                self._values[field] = self._load_field(field, parse)
+            return self._values[field]
+
+    def _load_field(self, field: str, parse: Callable[[], Any]) -> Any:
+        """Value of a field from the model file or the on-disk cache, or parsed from its sheets."""
+        if self.model_file is not None and field in self.model_file:
+            return self.model_file.decode(field)
+        if self.parse_cache is not None:
+            value = self.parse_cache.get(self._field_key(field), field)
+            if value is not None:
+                logger.info(f"Reused {field}, its sheets are unchanged: {FIELD_SHEETS[field]}")
+                self.reused_fields.append(field)
+                return value
+        if isinstance(self.sheets_data, SHEET_SOURCES) and field not in DERIVED_FIELDS:
+            # Let the source parse the sheets of the field together (in parallel).
+            self.sheets_data.prefetch(FIELD_SHEETS[field])
+        value = parse()
+        if field in DERIVED_FIELDS:
+            logger.info(f"Computed {field} from {', '.join(DERIVED_FIELDS[field])}")
+        else:
+            logger.info(f"Parsed {field} from sheets {FIELD_SHEETS[field]}")
+        if self.parse_cache is not None:
+            self.parse_cache.set(self._field_key(field), field, value)
+        return value
+
+    def ingest_report(self) -> dict[str, list[str]]:
+        """Sheets read from this upload so far ("reparsed"), and sheets of the fields
+        served from the parse cache that were not read ("reused")."""
+        reparsed = self.sheets_data.parsed_sheets if isinstance(self.sheets_data, SHEET_SOURCES) else []
+        reused = {
+            sheet for field in self.reused_fields if field not in DERIVED_FIELDS for sheet in FIELD_SHEETS[field]
+        }
+        return {
+            "reused": [sheet for sheet in sheet_names if sheet in reused and sheet not in reparsed],
+            "reparsed": reparsed,
+        }
+
+    @cached_property
+    def geometry(self) -> Geometry:
+        return self._field("geometry", lambda: get_geometry(self.sheets_data))
+
+    @cached_property
+    def nodes(self) -> dict[str, Node]:
+        """String keyed view of the joints of `geometry`, kept for the dict based tools."""
+        return self.geometry.nodes_dict()
+
+    @cached_property
+    def frames(self) -> dict[str, Frame]:
+        """String keyed view of the frames of `geometry`, kept for the dict based tools."""
+        return self.geometry.frames_dict()
+
+    @cached_property
+    def sections(self) -> dict[str, dict]:
+        return self._field("sections", lambda: get_sections(self.sheets_data))
+
+    @cached_property
+    def internal_loads(self) -> InternalForces:
+        return self._field("internal_loads", lambda: get_internal_loads(self.sheets_data))
+
+    @cached_property
+    def joints_disp(self) -> JointDisplacements:
+        return self._field("joints_disp", lambda: get_displacements(self.sheets_data))
+
+    @cached_property
+    def list_load_combos(self) -> list[str]:
+        return self._field("list_load_combos", lambda: get_load_combos(self.sheets_data))
+
+    @cached_property
+    def reactions(self) -> JointReactions:
+        return self._field("reactions", lambda: get_reactions(data_sheet=self.sheets_data))
+
+    @cached_property
+    def force_envelope(self) -> Envelope:
+        """Envelope of the internal loads over all combos at every frame station."""
+        return self._field("force_envelope", lambda: self.internal_loads.envelope())
+
+    @cached_property
+    def disp_envelope(self) -> Envelope:
+        """Envelope of the joint displacements over all combos."""
+        return self._field("disp_envelope", lambda: self.joints_disp.envelope())
+
+    @cached_property
+    def reaction_envelope(self) -> Envelope:
+        """Envelope of the support reactions over all output cases."""
+        return self._field("reaction_envelope", lambda: self.reactions.envelope())
+
+    @cached_property
+    def station_mesh(self) -> StationMesh:
+        """Geometry split at the internal load stations, shared by all internal load plots."""
+        return self._field("station_mesh", lambda: StationMesh.from_forces(self.geometry, self.internal_loads))
+
+    @cached_property
+    def model_context(self) -> str:
+        return self._field("model_context", lambda: get_model_ctx(data_sheet=self.sheets_data))
+
+
+# Parsed models of the last uploaded files, keyed by the hash of their content.
+_entities_cache: LRUCache[str, Entities] = LRUCache(max_items=4)
+_parse_cache = default_parse_cache()
+
+
+def load_entities(file_content: bytes | BinaryIO) -> Entities:
+    """Lazy entities of an uploaded .xlsx, zip of .csv tables or native model file,
+    shared between calls in this process and backed by the on-disk parse cache."""
+    if isinstance(file_content, bytes):
+        head = file_content[: len(MAGIC)]
+    else:
+        head = file_content.read(len(MAGIC))
+        file_content.seek(0)
+    if is_model_file(head):
+        model_file = open_model_file(file_content)
+        entities = _entities_cache.get(model_file.content_hash)
+        if entities is None:
+            entities = Entities({}, content_hash=model_file.content_hash, model_file=model_file)
+            _entities_cache.set(model_file.content_hash, entities)
+        return entities
+
+    sheets_data: Workbook | CsvTables
+    if is_csv_zip(file_content):
+        sheets_data, content_hash = open_csv_tables(file_content)
+    else:
+        sheets_data, content_hash = open_workbook(file_content)
+    entities = _entities_cache.get(content_hash)
+    if entities is None:
+        entities = Entities(sheets_data, content_hash=content_hash, parse_cache=_parse_cache)
+        _entities_cache.set(content_hash, entities)
+    return entities
+
+
+def cached_entities(content_hash: str) -> Entities | None:
+    """Entities of an upload loaded by this process, by the hash of its content."""
+    return _entities_cache.get(content_hash)
+
+
+def export_model(entities: Entities) -> bytes:
+    """Native model file of all fields of the entities, parsing the missing ones."""
+    return encode_model({field: getattr(entities, field) for field in FIELD_SHEETS}, entities.content_hash)
@@ -0,0 +1,145 @@
+"""Compact JSON of Plotly figures and scene payloads, as stored in vkt.Storage.
+
+Numeric arrays are written as Plotly typed arrays, `{"dtype": "f4", "bdata": <base64>,
+"shape": "n, 3"}`, which plotly.js reads as they are, so a stored figure is handed to
+`vkt.PlotlyResult` without being parsed or rebuilt. Floats are quantised to
+FIGURE_FLOAT_DTYPE ("f4" halves their size, "f8" keeps them exact) and integers use
+the smallest type that holds them. Documents are zlib compressed when
+FIGURE_COMPRESS_LEVEL is above 0, `text` and `loads` read both forms. With
+FIGURE_TYPED_ARRAYS off, the figures sent to the view keep plain JSON lists instead,
+for a plotly.js that cannot decode typed arrays.
+"""
+import base64
+import json
+import zlib
+import numpy as np
+
+from typing import Any
+from numpy.typing import NDArray
+from app.settings import FIGURE_FLOAT_DTYPE, FIGURE_COMPRESS_LEVEL, FIGURE_TYPED_ARRAYS
+
+# Typed array dtypes of plotly.js, in the order integers are fitted.
+INT_DTYPES = ("i1", "u1", "i2", "u2", "i4", "u4")
+FLOAT_DTYPES = ("f4", "f8")
+# Shorter numeric lists are kept as JSON lists.
+MIN_TYPED_LENGTH = 8
+
+
+def to_typed_array(values: NDArray[Any], float_dtype: str = FIGURE_FLOAT_DTYPE) -> dict[str, str]:
+    """Plotly typed array of a numeric array, floats quantised to float_dtype."""
+    values = np.asarray(values)
+    if values.dtype.kind in "iu" and values.size:
+        low, high = values.min(), values.max()
+        dtype = next((d for d in INT_DTYPES if np.iinfo(d).min <= low and high <= np.iinfo(d).max), "f8")
+    elif values.dtype.kind in "iu":
+        dtype = "i4"
+    else:
+        dtype = float_dtype
+    typed = {"dtype": dtype, "bdata": base64.b64encode(np.ascontiguousarray(values, dtype=dtype).tobytes()).decode()}
+    if values.ndim > 1:
+        typed["shape"] = ", ".join(str(n) for n in values.shape)
+    return typed
+
+
+def from_typed_array(typed: dict[str, str]) -> NDArray[Any]:
+    """Array of a Plotly typed array."""
+    values = np.frombuffer(base64.b64decode(typed["bdata"]), dtype=np.dtype(typed["dtype"]))
+    if "shape" in typed:
+        values = values.reshape([int(n) for n in typed["shape"].split(",")])
+    return values
+
+
+def _is_typed_array(obj: Any) -> bool:
+    return isinstance(obj, dict) and "bdata" in obj and "dtype" in obj
+
+
+def _is_numeric_list(obj: list) -> bool:
+    return len(obj) >= MIN_TYPED_LENGTH and all(
+        isinstance(v, (int, float)) and not isinstance(v, bool) for v in obj
+    )
+
+
+def compact(obj: Any, float_dtype: str = FIGURE_FLOAT_DTYPE) -> Any:
+    """Copy of a JSON-like document with its numeric arrays and lists as typed arrays."""
+    if _is_typed_array(obj):
+        # Typed arrays of plotly.py (e.g. f8) are quantised like the other arrays.
+        return to_typed_array(from_typed_array(obj), float_dtype)
+    if isinstance(obj, dict):
+        return {key: compact(value, float_dtype) for key, value in obj.items()}
+    if isinstance(obj, np.ndarray):
+        if obj.dtype.kind in "iuf" and obj.size:
+            return to_typed_array(obj, float_dtype)
+        return obj.tolist()
+    if isinstance(obj, (list, tuple)):
+        if _is_numeric_list(obj):
+            return to_typed_array(np.array(obj), float_dtype)
+        return [compact(value, float_dtype) for value in obj]
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def plain(obj: Any) -> Any:
+    """Copy of a JSON-like document with its numeric arrays and typed arrays as lists."""
+    if _is_typed_array(obj):
+        return from_typed_array(obj).tolist()
+    if isinstance(obj, dict):
+        return {key: plain(value) for key, value in obj.items()}
+    if isinstance(obj, np.ndarray):
+        return obj.tolist()
+    if isinstance(obj, (list, tuple)):
+        return [plain(value) for value in obj]
+    if isinstance(obj, np.generic):
+        return obj.item()
+    return obj
+
+
+def _expand(obj: Any) -> Any:
+    if _is_typed_array(obj):
+        return from_typed_array(obj)
+    if isinstance(obj, dict):
+        return {key: _expand(value) for key, value in obj.items()}
+    if isinstance(obj, list):
+        return [_expand(value) for value in obj]
+    return obj
+
+
+def dumps(
+    obj: Any,
+    float_dtype: str = FIGURE_FLOAT_DTYPE,
+    compress_level: int = FIGURE_COMPRESS_LEVEL,
+    typed_arrays: bool = True,
+) -> bytes:
+    """Compact JSON document of a figure (e.g. `fig.to_plotly_json()`) or scene payload,
+    without `typed_arrays` its numeric arrays are written as plain lists."""
+    if float_dtype not in FLOAT_DTYPES:
+        raise ValueError(f"Unsupported float dtype {float_dtype!r}, use one of {FLOAT_DTYPES}.")
+    document = compact(obj, float_dtype) if typed_arrays else plain(obj)
+    data = json.dumps(document, separators=(",", ":")).encode()
+    if compress_level > 0:
+        return zlib.compress(data, compress_level)
+    return data
+
+
+def text(raw: bytes) -> str:
+    """JSON text of a document written by `dumps`, decompressed when needed."""
+    if raw[:1] not in (b"{", b"["):
+        raw = zlib.decompress(raw)
+    return raw.decode()
+
+
+def loads(raw: bytes, arrays: bool = False) -> Any:
+    """Document written by `dumps`, with its typed arrays as numpy arrays when `arrays`."""
+    obj = json.loads(text(raw))
+    return _expand(obj) if arrays else obj
+
+
+def figure_document(figure: Any, compress_level: int = FIGURE_COMPRESS_LEVEL) -> bytes:
+    """Document of a go.Figure that is sent to the view as it is, with typed arrays
+    unless FIGURE_TYPED_ARRAYS is off."""
+    return dumps(figure.to_plotly_json(), compress_level=compress_level, typed_arrays=FIGURE_TYPED_ARRAYS)
+
+
+def figure_text(figure: Any) -> str:
+    """Compact, uncompressed JSON text of a go.Figure for `vkt.PlotlyResult`."""
+    return figure_document(figure, compress_level=0).decode()
@@ -0,0 +1,184 @@
+import logging
+import numpy as np
+
+from numpy.typing import NDArray
+from typing import NamedTuple
+from app.models import Node, Frame
+from app.results import InternalForces
+
+logger = logging.getLogger(__name__)
+
+
+class Geometry(NamedTuple):
+    """Compact geometry of a model: joints and frames addressed by dense indices.
+
+    Joints and frames keep the order of the sheets. `connectivity` holds the joint
+    indices (not ids) of the ends of each frame, so coordinates are looked up with
+    `coords[connectivity]`. Ids map to indices with `node_index` and `frame_index`.
+    """
+
+    node_ids: NDArray[np.int64]  # (n_nodes,) joint unique names.
+    coords: NDArray[np.float64]  # (n_nodes, 3) global X, Y, Z.
+    frame_ids: NDArray[np.int64]  # (n_frames,) frame unique names.
+    connectivity: NDArray[np.int32]  # (n_frames, 2) nodeI, nodeJ indices into node_ids.
+    node_order: NDArray[np.int64]  # (n_nodes,) argsort of node_ids.
+    frame_order: NDArray[np.int64]  # (n_frames,) argsort of frame_ids.
+
+    @classmethod
+    def from_arrays(
+        cls,
+        node_ids: NDArray[np.int64],
+        coords: NDArray[np.float64],
+        frame_ids: NDArray[np.int64],
+        frame_nodes: NDArray[np.int64],
+    ) -> "Geometry":
+        """Build the geometry from joint ids and coordinates and from frame ids and their
+        (n, 2) end joint ids. Duplicated ids keep their first position and last values,
+        like the dicts built from the sheets did. Frames with an unknown joint are dropped."""
+        node_rows = _dedupe(node_ids)
+        node_ids, coords = node_ids[node_rows], coords[node_rows]
+        frame_rows = _dedupe(frame_ids)
+        frame_ids, frame_nodes = frame_ids[frame_rows], frame_nodes[frame_rows]
+
+        node_order = np.argsort(node_ids, kind="stable")
+        connectivity = _lookup(node_ids, node_order, frame_nodes.ravel()).reshape(-1, 2)
+        known = (connectivity >= 0).all(axis=1)
+        if not known.all():
+            logger.warning(f"Dropped {int((~known).sum())} frames connected to unknown joints.")
+            frame_ids, connectivity = frame_ids[known], connectivity[known]
+        return cls(
+            node_ids=node_ids,
+            coords=np.ascontiguousarray(coords, dtype=np.float64),
+            frame_ids=frame_ids,
+            connectivity=connectivity.astype(np.int32),
+            node_order=node_order,
+            frame_order=np.argsort(frame_ids, kind="stable"),
+        )
+
+    def node_index(self, node_ids: NDArray[np.int64] | int) -> NDArray[np.int64]:
+        """Indices of joint ids, -1 for unknown joints."""
+        return _lookup(self.node_ids, self.node_order, np.asarray(node_ids, dtype=np.int64))
+
+    def frame_index(self, frame_ids: NDArray[np.int64] | int) -> NDArray[np.int64]:
+        """Indices of frame ids, -1 for unknown frames."""
+        return _lookup(self.frame_ids, self.frame_order, np.asarray(frame_ids, dtype=np.int64))
+
+    def endpoints(self) -> NDArray[np.float64]:
+        """(n_frames, 2, 3) coordinates of the nodeI and nodeJ of every frame."""
+        return self.coords[self.connectivity]
+
+    def nodes_dict(self) -> dict[str, Node]:
+        """Joints as the string keyed dicts of app.models, for code not yet using indices."""
+        return {
+            str(node_id): Node(id=node_id, x=x, y=y, z=z)
+            for node_id, (x, y, z) in zip(self.node_ids.tolist(), self.coords.tolist())
+        }
+
+    def frames_dict(self) -> dict[str, Frame]:
+        """Frames as the string keyed dicts of app.models, for code not yet using indices."""
+        end_ids = self.node_ids[self.connectivity].tolist()
+        return {
+            str(frame_id): Frame(id=frame_id, nodeI=node_i, nodeJ=node_j)
+            for frame_id, (node_i, node_j) in zip(self.frame_ids.tolist(), end_ids)
+        }
+
+
+class StationMesh(NamedTuple):
+    """Geometry of a model with every frame split into segments at its output stations.
+
+    `geometry` keeps the joints and the frames that are not split first, then holds the
+    inner station joints and the segments (in frame order, with new ids after the
+    largest ones of the model). `segment_frames` and `segment_stations` map each line of
+    `geometry` back to the frame of InternalForces it is a segment of and the rank of
+    the station it starts at, so the forces of any combo are looked up per segment.
+    """
+
+    geometry: Geometry
+    segment_frames: NDArray[np.int64]  # (n_lines,) index into InternalForces.frame_ids, -1 for unsplit frames.
+    segment_stations: NDArray[np.int64]  # (n_lines,) station rank of the segment start, -1 for unsplit frames.
+
+    @classmethod
+    def from_forces(cls, geometry: Geometry, forces: InternalForces) -> "StationMesh":
+        """Split the frames of the geometry at the distinct stations of their internal loads.
+        Zero length frames, frames without loads and frames with less than two stations
+        are kept whole."""
+        station_offsets, station_values = forces.station_items()
+        frame_idx = forces.frame_indices(geometry.frame_ids)
+        n_stations = np.zeros(len(frame_idx), dtype=np.int64)
+        n_stations[frame_idx >= 0] = np.diff(station_offsets)[frame_idx[frame_idx >= 0]]
+
+        start, end = geometry.endpoints().transpose(1, 0, 2)
+        direction = end - start
+        dx, dy, dz = direction.T
+        line_length = np.sqrt(dx**2 + dy**2 + dz**2)
+        zero_length = line_length == 0
+        missing = ~zero_length & (frame_idx < 0)
+        few_stations = ~zero_length & ~missing & (n_stations < 2)
+        for line_id in geometry.frame_ids[zero_length].tolist():
+            logger.warning(f"Line {line_id} has zero length. Skipping discretization.")
+        for line_id in geometry.frame_ids[missing].tolist():
+            logger.warning(f"Line {line_id} not found in comb_forces. Skipping.")
+        for line_id in geometry.frame_ids[few_stations].tolist():
+            logger.warning(f"Not enough station values for line {line_id}. Skipping.")
+        split = ~(zero_length | missing | few_stations)
+
+        # One entry per station of the split lines, in line order.
+        lines = np.flatnonzero(split)
+        line_stations = n_stations[lines]
+        line_of = np.repeat(np.arange(len(lines)), line_stations)
+        rank = np.arange(int(line_stations.sum())) - np.repeat(np.cumsum(line_stations) - line_stations, line_stations)
+        stations = station_values[station_offsets[frame_idx[lines]][line_of] + rank]
+        last = rank == line_stations[line_of] - 1
+
+        # New joints at the inner stations, the ends are the joints of the frame.
+        inner = (rank > 0) & ~last
+        unit_direction = direction[lines] / line_length[lines, None]
+        new_coords = start[lines][line_of[inner]] + stations[inner, None] * unit_direction[line_of[inner]]
+        station_nodes = np.where(
+            rank == 0, geometry.connectivity[lines, 0][line_of], geometry.connectivity[lines, 1][line_of]
+        ).astype(np.int64)
+        station_nodes[inner] = len(geometry.node_ids) + np.arange(int(inner.sum()))
+
+        # A segment from every station but the last of each line to the next station.
+        segment_starts = np.flatnonzero(~last)
+        n_kept = len(geometry.frame_ids) - len(lines)
+        node_ids = np.concatenate(
+            [geometry.node_ids, int(geometry.node_ids.max()) + 1 + np.arange(int(inner.sum()), dtype=np.int64)]
+        )
+        frame_ids = np.concatenate(
+            [geometry.frame_ids[~split], int(geometry.frame_ids.max()) + 1 + np.arange(len(segment_starts), dtype=np.int64)]
+        )
+        discretized = Geometry(
+            node_ids=node_ids,
+            coords=np.concatenate([geometry.coords, new_coords.reshape(-1, 3)]),
+            frame_ids=frame_ids,
+            connectivity=np.concatenate([
+                geometry.connectivity[~split],
+                np.column_stack([station_nodes[segment_starts], station_nodes[segment_starts + 1]]).astype(np.int32),
+            ]),
+            node_order=np.argsort(node_ids, kind="stable"),
+            frame_order=np.argsort(frame_ids, kind="stable"),
+        )
+        logger.info("Discretization completed.")
+        return cls(
+            geometry=discretized,
+            segment_frames=np.concatenate([np.full(n_kept, -1), frame_idx[lines][line_of[segment_starts]]]),
+            segment_stations=np.concatenate([np.full(n_kept, -1), rank[segment_starts]]),
+        )
+
+
+def _dedupe(ids: NDArray[np.int64]) -> NDArray[np.int64]:
+    """Rows of the last occurrence of every id, ordered by its first occurrence."""
+    _, first = np.unique(ids, return_index=True)
+    _, last_reversed = np.unique(ids[::-1], return_index=True)
+    last = len(ids) - 1 - last_reversed
+    return last[np.argsort(first)]
+
+
+def _lookup(ids: NDArray[np.int64], order: NDArray[np.int64], queries: NDArray[np.int64]) -> NDArray[np.int64]:
+    """Positions of `queries` in `ids` (sorted by `order`), -1 where missing."""
+    if len(ids) == 0:
+        return np.full(np.shape(queries), -1, dtype=np.int64)
+    pos = np.clip(np.searchsorted(ids[order], queries), 0, len(ids) - 1)
+    index = order[pos]
+    return np.where(ids[index] == queries, index, -1)
@@ -1,40 +1,102 @@
 import plotly.graph_objects as go #type: ignore
+import json
 import logging
 import pprint
+import threading
 
 import instructor
 from instructor.dsl.partial import PartialLiteralMixin
 from pydantic import BaseModel, Field
 from dotenv import load_dotenv
 from openai import OpenAI
-from openai.types.chat import ParsedChatCompletion
-from typing import Any, Literal, Union
+from openai.types import CompletionUsage
+from openai.types.chat import ChatCompletionChunk, ParsedChatCompletion
+from collections.abc import Iterable, Iterator
+from typing import Any, ClassVar, Literal, Union
 from textwrap import dedent
 
-from app.tools.render_scene import plot_3d_scene
+from app.tools.render_scene import Scene, SceneGeometry, SceneOverlay, ViewDocument
 from app.tools.render_internal_loads import (
-    plot_3d_scene_with_forces,
-    generater_station_point,
+    forces_overlay,
+    station_forces,
+    segment_envelope,
 )
 from app.tools.reaction_loads import plot_reaction
-from app.tools.render_displacements import plot_3d_disp_scene
+from app.tools.render_displacements import disp_overlay, disp_envelope_overlay
 from app.tools.design_foundations import plot_foundations, plot_foundations_envelope
 from app.parse_xlsx import sheet_names
-from app.models import Entities
+from app.entities import Entities
+from app.prewarm import WarmupStep, warm_result
+from app import figure_json
+from app.cache import LRUCache
+from app.settings import TOOL_CACHE_MAX_ITEMS, TOOL_CACHE_MAX_BYTES
 
 # Logger to debug streaming responses
 logger = logging.getLogger(__name__)
 # Load .env variables.
 load_dotenv()
+# Prompt tokens of all requests of this process, and those served from the provider's
+# prompt cache, to follow its hit rate.
+prompt_cache_usage = {"requests": 0, "prompt_tokens": 0, "cached_tokens": 0}
+_usage_lock = threading.Lock()
+
+
+def record_usage(usage: CompletionUsage) -> None:
+    """Add the usage of a request to `prompt_cache_usage` and log its cached tokens."""
+    details = usage.prompt_tokens_details
+    cached_tokens = (details.cached_tokens if details else None) or 0
+    with _usage_lock:
+        prompt_cache_usage["requests"] += 1
+        prompt_cache_usage["prompt_tokens"] += usage.prompt_tokens
+        prompt_cache_usage["cached_tokens"] += cached_tokens
+        hit_rate = prompt_cache_usage["cached_tokens"] / max(prompt_cache_usage["prompt_tokens"], 1)
+    logger.info(
+        f"Prompt tokens: {usage.prompt_tokens}, cached: {cached_tokens} (hit rate {hit_rate:.0%} over "
+        f"{prompt_cache_usage['requests']} requests)"
+    )
+
+
+def _create_recording_usage(*args: Any, **kwargs: Any) -> Any:
+    """`chat.completions.create` of OpenAI that records the usage of every request."""
+    completion = openai_client.chat.completions.create(*args, **kwargs)
+    if not kwargs.get("stream"):
+        if completion.usage:
+            record_usage(completion.usage)
+        return completion
+    return _record_stream_usage(completion)
+
+
+def _record_stream_usage(chunks: Iterable[ChatCompletionChunk]) -> Iterator[ChatCompletionChunk]:
+    for chunk in chunks:
+        if chunk.usage:
+            record_usage(chunk.usage)
+        yield chunk
+
+
 # Patch OpenAI Client:
-client = instructor.from_openai(OpenAI())
+openai_client = OpenAI()
+client = instructor.Instructor(
+    client=openai_client,
+    create=instructor.patch(create=_create_recording_usage, mode=instructor.Mode.TOOLS),
+    mode=instructor.Mode.TOOLS,
+)
 
 # Anthropic Client:
 # import anthropic
 # client = instructor.from_anthropic(create=anthropic.Anthropic())
 
 class Tool(BaseModel):
-    pass
+    # Fields that do not change the output of the tool, left out of its cache key.
+    cache_ignore: ClassVar[frozenset[str]] = frozenset()
+
+    def cache_args(self) -> str:
+        """Normalized arguments of the tool: the validated fields, sorted and without
+        the ignored ones (so 100 and 100.0 kN/m2 are the same call)."""
+        ignored = set(self.cache_ignore)
+        if getattr(self, "envelope", False):
+            # Envelope plots ignore the load case, see the `envelope` fields.
+            ignored.add("load_case")
+        return json.dumps(self.model_dump(exclude=ignored), sort_keys=True)
 
 
 class PlotReactions(Tool):
@@ -56,12 +118,20 @@ class PlotModel(Tool):
 
 class PlotDeformedShape(Tool):
     """Plots the deformed shape of the model for a selected load combo"""
+    # The deformed shape is always drawn with the same scale factor.
+    cache_ignore = frozenset({"scale_factor"})
 
     load_case: Union[str, None] = Field(
         ...,
         description = dedent("""Load case or combination for which the deformation or 
         displacements will be plotted.""")
     )
+    envelope: bool = Field(
+        False,
+        description = dedent("""Set to True to plot the max-abs envelope of the displacements 
+        of all load combinations, with the combination that governs each, instead of a 
+        single load case, load_case is then ignored.""")
+    )
     scale_factor: Union[float , None] = Field(
         ...,
         description = dedent("""Optional. If the user wants to plot the deformation of 
@@ -78,6 +148,11 @@ class PlotInternalForces(Tool, PartialLiteralMixin):
         will be plotted. If the user does not provide one, assign one based on your 
         context and ask the user to confirm it.""")
     )
+    envelope: bool = Field(
+        False,
+        description = dedent("""Set to True to plot the max-abs envelope of all load 
+        combinations instead of a single load case, load_case is then ignored.""")
+    )
     force_component: Literal["P", "V1", "V2", "T", "M1", "M2", "M3"] = Field(
         ...,
         description = dedent("""Internal load or force component that the user wants to plot. 
@@ -101,6 +176,7 @@ class PadFoundationDesignForLoadCase(Tool):
 
 class PadFoundationDesignForLoadEnvelope(Tool):
     """Design Pad foundations based on the enveloped of the reaction loads and soil preassure for all load cases."""
+    cache_ignore = frozenset({"tools_description"})
     soil_pressure: float = Field(
         ...,
         description = dedent("""Soil Pressure value, the user need to provide this values in kN/m2,
@@ -109,46 +185,76 @@ class PadFoundationDesignForLoadEnvelope(Tool):
     tools_description: str = Field(..., description="Design Pad foundations based on the enveloped of the reaction loads and soil preassure for all load cases.")
 
 class Response(BaseModel):
-    response: str = Field(..., description="Be conversational firendly and Format the response always nicely, if the user haven't uploaded the file reminde him and list the required excel sheets!")
+    # The tool comes first: it is complete, and can run, once the response text starts streaming.
     selected_tool: (
         Union[None , PlotReactions , PlotDeformedShape , PlotInternalForces , PadFoundationDesignForLoadCase , PadFoundationDesignForLoadEnvelope]
     ) = Field(..., description="Select any of these tools, otherwise return None")
+    response: str = Field(..., description="Be conversational firendly and Format the response always nicely, if the user haven't uploaded the file reminde him and list the required excel sheets!")
+
+
+# Static instructions, sent first and identical for every request, so the provider
+# caches them (with the tool schema) as the prefix of the prompt.
+SYSTEM_INSTRUCTIONS = dedent(
+    """You are a helpful assistant with the following context, who formats your responses nicely and helps answer questions about a structural model.
+    Respond by describing the functionality of the tools you have without mentioning their names explicitly.
+
+    Important:
+    The next message gives the file_status, the required_sheets and the content from the model.
+    If the file_status is 'No File Uploaded' or empty, ask the user to upload an XLSX file of their ETABS model with the required_sheets.
+
+    If file_status is "File Uploaded" AND THE USER HAS NOT MADE ANY REQUEST, be friendly and thank them for uploading the file!
+
+    Format all responses Nicely without using Markdown!
+    Format all responses Nicely without using Markdown!
+    Format all responses Nicely without using Markdown!
+    ALSO CONVERT LIST [ITEM1, ITEM2, ITEM3] TO nice itemization!
+    """
+)
+
+
+def build_messages(ctx: Any, conversation_history: list[dict],
+                   file_status: str = "No File Uploaded",
+                   required_sheets: list[str] = None) -> list[dict]:
+    """Prompt of a request, laid out for provider prefix caching: the static
+    instructions, then the context block of the model, which is byte-identical on
+    every turn for the same model, and only then the conversation."""
+    if required_sheets is None:
+        required_sheets = sheet_names  # Assuming sheet_names is defined globally
+    context_message = {
+        "role": "system",
+        "content": (
+            f"current file_status = {file_status}\n"
+            f"required_sheets = {required_sheets}\n"
+            f"This is the content from the model: {ctx}."
+        ),
+    }
+    return [
+        {"role": "system", "content": SYSTEM_INSTRUCTIONS},
+        context_message,
+        # The conversation history as provided by the front end
+        *conversation_history,
+    ]
 
 
 def llm_response(ctx: Any, conversation_history: list[dict],
                  file_status: str = "No File Uploaded",
                  required_sheets: list[str] = None,
                  verbose: bool = False) -> ParsedChatCompletion[Response]:
-    if required_sheets is None:
-        required_sheets = sheet_names  # Assuming sheet_names is defined globally
+    """Final response of the LLM, see `llm_response_stream`."""
+    resp_final = None
+    for resp in llm_response_stream(ctx, conversation_history, file_status, required_sheets, verbose):
+        resp_final: Response = resp
+    return resp_final
+
+
+def llm_response_stream(ctx: Any, conversation_history: list[dict],
+                        file_status: str = "No File Uploaded",
+                        required_sheets: list[str] = None,
+                        verbose: bool = False) -> Iterator[Response]:
+    """Partial responses of the LLM as they are generated: the selected tool first,
+    then the growing response text."""
+    messages = build_messages(ctx, conversation_history, file_status, required_sheets)
 
-    messages = []
-    # Default system prompt is always first
-    system_message = {
-        "role": "system",
-        "content": dedent(
-            f"""You are a helpful assistant with the following context, who formats your responses nicely and helps answer questions about a structural model.
-            Respond by describing the functionality of the tools you have without mentioning their names explicitly.
-            
-            Important:
-            If the file_status is 'No File Uploaded' or empty, ask the user to upload an XLSX file of their ETABS model with the following sheets: {required_sheets}. current file_status = {file_status}.
-
-            If file_status is "File Uploaded" AND THE USER HAS NOT MADE ANY REQUEST, be friendly and thank them for uploading the file!
-
-            This is the content from the model: {ctx}.
-
-            Format all responses Nicely without using Markdown!
-            Format all responses Nicely without using Markdown!
-            Format all responses Nicely without using Markdown!
-            ALSO CONVERT LIST [ITEM1, ITEM2, ITEM3] TO nice itemization!
-            
-            """
-        )
-    }
-    messages.append(system_message)
-    # Append the conversation history as provided by the front end
-    messages.extend(conversation_history)
-    
     # Optionally log the messages if verbose is enabled
     if verbose:
         logger.debug("Request messages:\n%s", pprint.pformat(messages))
@@ -159,68 +265,176 @@ def llm_response(ctx: Any, conversation_history: list[dict],
         messages=messages,
         response_model=Response,
         temperature=0.5,
+        # The last chunk reports the usage, with the prompt tokens read from the cache.
+        stream_options={"include_usage": True},
     )
 
-    resp_final = None
     # Streaming
     for resp in resp_chunks:
         if verbose:
             logger.debug("Received response chunk:\n%s", resp)
-        resp_final: Response = resp 
-
-    return resp_final
-
-
-def execute_tool(response: Response, entities: Entities) -> tuple[str, go.Figure | None]:
-    """Exectue the tools based on the user query and file_content. Generates a text response
-    or a Plotly view."""
-
-    if isinstance(response.selected_tool, PlotModel):
-        if response.selected_tool.args == "model":
-            return response.response, plot_3d_scene(entities.nodes, entities.frames)
-
-    if isinstance(response.selected_tool, PlotReactions):
-        if response.selected_tool.load_case:
-            return response.response, plot_reaction(
-                merged_data=entities.reactions_payloads, load_case=response.selected_tool.load_case
+        yield resp
+
+
+def tool_ready(partial: Response) -> bool:
+    """Whether the selected tool of a partial response is complete: its fields are
+    generated before the response text, so it is once the text has started."""
+    return partial.response is not None
+
+
+def scene_geometry(entities: Entities, stations: bool = False) -> SceneGeometry:
+    """Geometry of the 3D scenes of a model, or of its station mesh, keyed by the model hash."""
+    if stations:
+        return SceneGeometry.from_geometry(f"{entities.content_hash}-stations", entities.station_mesh.geometry)
+    return SceneGeometry.from_geometry(f"{entities.content_hash}-model", entities.geometry)
+
+
+def model_scene(entities: Entities) -> Scene:
+    """3D scene of the model without results."""
+    return Scene(scene_geometry(entities), SceneOverlay())
+
+
+# Soil pressure (kN/m2) the foundation tools default to.
+DEFAULT_SOIL_PRESSURE = 100.0
+
+# Warm-up of an uploaded model (see app.prewarm): the base scene for the view, the
+# context of the first message, the reactions with their envelope and the envelope
+# foundation plot at the default soil pressure, then the other results with their
+# envelopes and the station mesh.
+WARMUP_STEPS: list[WarmupStep] = [
+    ("base_scene", lambda entities: figure_json.figure_text(model_scene(entities).figure())),
+    ("model_context", lambda entities: entities.model_context),
+    ("list_load_combos", lambda entities: entities.list_load_combos),
+    ("reaction_envelope", lambda entities: entities.reaction_envelope),
+    ("foundations_envelope", lambda entities: plot_foundations_envelope(
+        reactions=entities.reactions,
+        envelope=entities.reaction_envelope,
+        bearing_pressure=DEFAULT_SOIL_PRESSURE,
+    )),
+    ("disp_envelope", lambda entities: entities.disp_envelope),
+    ("force_envelope", lambda entities: entities.force_envelope),
+    ("station_mesh", lambda entities: entities.station_mesh),
+]
+
+
+def run_tool(tool: Tool, entities: Entities) -> Scene | go.Figure | None:
+    """Run a tool on the entities of the model. Generates a Plotly view, 3D views are
+    returned as a Scene, the geometry of the model and the result overlay drawn on it."""
+
+    if isinstance(tool, PlotModel):
+        if tool.args == "model":
+            return model_scene(entities)
+
+    if isinstance(tool, PlotReactions):
+        if tool.load_case:
+            return plot_reaction(
+                reactions=entities.reactions, load_case=tool.load_case
             )
 
-    if isinstance(response.selected_tool, PlotDeformedShape):
-        if response.selected_tool.load_case:
-            return response.response, plot_3d_disp_scene(
-                nodes=entities.nodes,
-                lines=entities.frames,
-                disp=entities.joints_disp,
-                output_case=response.selected_tool.load_case,
-                sf=80,
+    if isinstance(tool, PlotDeformedShape):
+        if tool.envelope:
+            return Scene(
+                scene_geometry(entities),
+                disp_envelope_overlay(
+                    geometry=entities.geometry,
+                    envelope=entities.disp_envelope,
+                    sf=80,
+                ),
+            )
+        if tool.load_case:
+            return Scene(
+                scene_geometry(entities),
+                disp_overlay(
+                    geometry=entities.geometry,
+                    disp=entities.joints_disp,
+                    output_case=tool.load_case,
+                    sf=80,
+                ),
             )
 
-    if isinstance(response.selected_tool, PlotInternalForces):
-        if response.selected_tool.load_case:
-            nodes, lines, new_comb_forces = generater_station_point(
-                nodes=entities.nodes, lines=entities.frames, comb_forces=entities.internal_loads
+    if isinstance(tool, PlotInternalForces):
+        if tool.envelope:
+            case_forces, case_combos = segment_envelope(
+                mesh=entities.station_mesh,
+                comb_forces=entities.internal_loads,
+                envelope=entities.force_envelope,
+            )
+            return Scene(
+                scene_geometry(entities, stations=True),
+                forces_overlay(
+                    case_forces=case_forces,
+                    n_lines=len(entities.station_mesh.segment_frames),
+                    force_component=tool.force_component,
+                    case_combos=case_combos,
+                    combos=entities.force_envelope.combos,
+                ),
             )
-            return response.response, plot_3d_scene_with_forces(
-                nodes=nodes,
-                lines=lines,
-                forces=new_comb_forces,
-                load_case=response.selected_tool.load_case,
-                force_component=response.selected_tool.force_component,
+        if tool.load_case:
+            case_forces = station_forces(
+                mesh=entities.station_mesh,
+                comb_forces=entities.internal_loads,
+                load_cases=[tool.load_case],
+            ).get(tool.load_case)
+            return Scene(
+                scene_geometry(entities, stations=True),
+                forces_overlay(
+                    case_forces=case_forces,
+                    n_lines=len(entities.station_mesh.segment_frames),
+                    force_component=tool.force_component,
+                ),
             )
 
-    if isinstance(response.selected_tool, PadFoundationDesignForLoadCase):
-        if response.selected_tool.load_case:
-            return response.response, plot_foundations(
-                merged_data=entities.reactions_payloads,
-                bearing_pressure=response.selected_tool.soil_pressure,
-                load_case=response.selected_tool.load_case,
+    if isinstance(tool, PadFoundationDesignForLoadCase):
+        if tool.load_case:
+            return plot_foundations(
+                reactions=entities.reactions,
+                bearing_pressure=tool.soil_pressure,
+                load_case=tool.load_case,
             )
 
-    if isinstance(response.selected_tool, PadFoundationDesignForLoadEnvelope):
-        if response.selected_tool.soil_pressure:
-            return response.response, plot_foundations_envelope(
-                merged_data=entities.reactions_payloads,
-                bearing_pressure=response.selected_tool.soil_pressure
+    if isinstance(tool, PadFoundationDesignForLoadEnvelope):
+        if tool.soil_pressure:
+            # Rendered ahead by the warm-up of the model for the default soil pressure,
+            # computed here when the warm-up has not reached it yet.
+            if tool.soil_pressure == DEFAULT_SOIL_PRESSURE:
+                warm_figure = warm_result(entities, "foundations_envelope", wait=False)
+                if warm_figure is not None:
+                    return warm_figure
+            return plot_foundations_envelope(
+                reactions=entities.reactions,
+                envelope=entities.reaction_envelope,
+                bearing_pressure=tool.soil_pressure
             )
 
-    return response.response, None
+    return None
+
+
+# Serialised outputs of the last tool calls, keyed by model, tool and arguments.
+_tool_results: LRUCache[tuple[str, str, str], ViewDocument] = LRUCache(
+    max_items=TOOL_CACHE_MAX_ITEMS,
+    max_bytes=TOOL_CACHE_MAX_BYTES,
+    size=lambda view: len(view.document),
+)
+
+
+def execute_tool(response: Response, entities: Entities) -> tuple[str, ViewDocument | None]:
+    """Exectue the tools based on the user query and file_content. Generates a text response
+    or a serialised Plotly view. Repeated calls of a tool with the same arguments on the
+    same model are served from a cache."""
+    tool = response.selected_tool
+    if tool is None:
+        return response.response, None
+    # Tools of streamed responses are instances of the partial models of the tool classes.
+    key = (entities.content_hash, type(tool).__name__.removeprefix("Partial"), tool.cache_args())
+    view = _tool_results.get(key)
+    if view is not None:
+        logger.info(
+            f"Reused {type(tool).__name__} view ({_tool_results.hits} hits, {_tool_results.misses} misses)"
+        )
+        return response.response, view
+    figure = run_tool(tool, entities)
+    if figure is None:
+        return response.response, None
+    view = ViewDocument.from_figure(figure)
+    _tool_results.set(key, view)
+    return response.response, view
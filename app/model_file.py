@@ -0,0 +1,246 @@
+"""Native model file, the parsed entities of a model in a single memory-mappable file.
+
+Layout: MAGIC, the header length as a little-endian uint64, a JSON header and the
+raw arrays, each starting at a multiple of 64 bytes. The header holds the hash of
+the source upload and, per field, the dtype, shape and offset of its arrays, so
+opening a file maps the arrays without copying or parsing them.
+"""
+import io
+import os
+import json
+import mmap
+import struct
+import shutil
+import tempfile
+import weakref
+import numpy as np
+
+from collections.abc import Callable, Iterator, Mapping
+from typing import Any, BinaryIO, NamedTuple
+from app.geometry import Geometry, StationMesh
+from app.results import Envelope, InternalForces, JointDisplacements, JointReactions
+
+MAGIC = b"TWYMODEL"
+FORMAT_VERSION = 3
+MODEL_FILE_SUFFIX = ".twym"
+_ALIGN = 64
+_HEADER_LENGTH = struct.Struct("<Q")
+
+Arrays = dict[str, np.ndarray]
+
+
+def _text(value: str) -> np.ndarray:
+    return np.frombuffer(value.encode(), dtype=np.uint8)
+
+
+def _from_text(array: np.ndarray) -> str:
+    return array.tobytes().decode()
+
+
+def _encode_sections(sections: dict[str, dict]) -> Arrays:
+    frame_ids = [section["frame_ids"] for section in sections.values()]
+    return {
+        "names": _text(json.dumps(list(sections))),
+        "offsets": np.cumsum([0, *map(len, frame_ids)]).astype(np.int64),
+        "frame_ids": np.array([fid for ids in frame_ids for fid in ids], dtype=np.int64),
+    }
+
+
+def _decode_sections(arrays: Arrays) -> dict[str, dict]:
+    names = json.loads(_from_text(arrays["names"]))
+    offsets, frame_ids = arrays["offsets"], arrays["frame_ids"].tolist()
+    return {
+        name: {"name": name, "frame_ids": frame_ids[offsets[i]:offsets[i + 1]]}
+        for i, name in enumerate(names)
+    }
+
+
+def _store_codec(cls: type[NamedTuple]) -> tuple[Callable[[Any], Arrays], Callable[[Arrays], Any]]:
+    """Codec for the columnar stores of app.results, the combo lists are stored as JSON."""
+
+    def encode(store: Any) -> Arrays:
+        return {
+            name: value if isinstance(value, np.ndarray) else _text(json.dumps(value))
+            for name, value in store._asdict().items()
+        }
+
+    def decode(arrays: Arrays) -> Any:
+        return cls(**{
+            name: arrays[name] if arrays[name].dtype != np.uint8 else json.loads(_from_text(arrays[name]))
+            for name in cls._fields
+        })
+
+    return encode, decode
+
+
+def _encode_station_mesh(mesh: StationMesh) -> Arrays:
+    geometry = _store_codec(Geometry)[0](mesh.geometry)
+    return {
+        **{f"geometry.{name}": array for name, array in geometry.items()},
+        "segment_frames": mesh.segment_frames,
+        "segment_stations": mesh.segment_stations,
+    }
+
+
+def _decode_station_mesh(arrays: Arrays) -> StationMesh:
+    geometry = _store_codec(Geometry)[1]({name: arrays[f"geometry.{name}"] for name in Geometry._fields})
+    return StationMesh(geometry, arrays["segment_frames"], arrays["segment_stations"])
+
+
+# Binary codec of every cached Entities field: value -> named arrays -> value.
+FIELD_CODECS: dict[str, tuple[Callable[[Any], Arrays], Callable[[Arrays], Any]]] = {
+    "geometry": _store_codec(Geometry),
+    "sections": (_encode_sections, _decode_sections),
+    "internal_loads": _store_codec(InternalForces),
+    "joints_disp": _store_codec(JointDisplacements),
+    "list_load_combos": (lambda combos: {"combos": _text(json.dumps(combos))},
+                         lambda arrays: json.loads(_from_text(arrays["combos"]))),
+    "reactions": _store_codec(JointReactions),
+    "force_envelope": _store_codec(Envelope),
+    "disp_envelope": _store_codec(Envelope),
+    "reaction_envelope": _store_codec(Envelope),
+    "station_mesh": (_encode_station_mesh, _decode_station_mesh),
+    "model_context": (lambda ctx: {"text": _text(ctx)}, lambda arrays: _from_text(arrays["text"])),
+}
+
+
+def _aligned(offset: int) -> int:
+    return -(-offset // _ALIGN) * _ALIGN
+
+
+def write_model_file(target: str | BinaryIO, fields: Mapping[str, Arrays], content_hash: str = "") -> None:
+    """Write the encoded fields of a model to a path or a binary file object."""
+    layout: dict[str, dict[str, dict[str, Any]]] = {}
+    arrays: list[tuple[int, np.ndarray]] = []
+    offset = 0
+    for field, field_arrays in fields.items():
+        layout[field] = {}
+        for name, array in field_arrays.items():
+            array = np.ascontiguousarray(array)
+            layout[field][name] = {"dtype": array.dtype.str, "shape": list(array.shape), "offset": offset}
+            arrays.append((offset, array))
+            offset = _aligned(offset + array.nbytes)
+    header = json.dumps(
+        {"version": FORMAT_VERSION, "content_hash": content_hash, "fields": layout}
+    ).encode()
+    data_start = _aligned(len(MAGIC) + _HEADER_LENGTH.size + len(header))
+
+    def write(f: BinaryIO) -> None:
+        f.write(MAGIC + _HEADER_LENGTH.pack(len(header)) + header)
+        position = len(MAGIC) + _HEADER_LENGTH.size + len(header)
+        for start, array in arrays:
+            f.write(b"\0" * (data_start + start - position))
+            f.write(array.data)
+            position = data_start + start + array.nbytes
+
+    if isinstance(target, str):
+        with open(target, "wb") as f:
+            write(f)
+    else:
+        write(target)
+
+
+def is_model_file(head: bytes) -> bool:
+    """Whether the first bytes of an upload are those of a native model file."""
+    return head[: len(MAGIC)] == MAGIC
+
+
+def _check_magic(head: bytes) -> None:
+    if len(head) < len(MAGIC) + _HEADER_LENGTH.size or not is_model_file(bytes(head)):
+        raise ValueError("Not a native model file.")
+
+
+def _count(spec: dict[str, Any]) -> int:
+    """Number of items of an array in the header layout."""
+    return int(np.prod(spec["shape"], dtype=np.int64))
+
+
+def _nbytes(spec: dict[str, Any]) -> int:
+    """Size in bytes of an array in the header layout."""
+    return _count(spec) * np.dtype(spec["dtype"]).itemsize
+
+
+class ModelFile(Mapping[str, Arrays]):
+    """Read-only view of a native model file, mapping field -> arrays.
+
+    A path is memory mapped, the arrays are views onto the mapping and keep it
+    open as long as they are used. `temporary` files are removed once the
+    ModelFile and its arrays are garbage collected.
+    """
+
+    def __init__(self, source: str | bytes, temporary: bool = False) -> None:
+        if isinstance(source, str):
+            try:
+                with open(source, "rb") as f:
+                    # Files that are not model files are rejected before mapping them.
+                    _check_magic(f.read(len(MAGIC) + _HEADER_LENGTH.size))
+                    self._buffer: Any = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError:
+                if temporary:
+                    _remove(source)
+                raise
+            if temporary:
+                weakref.finalize(self._buffer, _remove, source)
+        else:
+            _check_magic(source[: len(MAGIC) + _HEADER_LENGTH.size])
+            self._buffer = source
+        (header_length,) = _HEADER_LENGTH.unpack_from(self._buffer, len(MAGIC))
+        header_start = len(MAGIC) + _HEADER_LENGTH.size
+        if header_start + header_length > len(self._buffer):
+            raise ValueError("Truncated model file.")
+        header = json.loads(bytes(self._buffer[header_start : header_start + header_length]))
+        if header["version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported model file version {header['version']}.")
+        self.content_hash: str = header["content_hash"]
+        self._layout: dict[str, dict[str, dict[str, Any]]] = header["fields"]
+        self._data_start = _aligned(header_start + header_length)
+        data_end = max(
+            (spec["offset"] + _nbytes(spec) for specs in self._layout.values() for spec in specs.values()),
+            default=0,
+        )
+        if self._data_start + data_end > len(self._buffer):
+            raise ValueError("Truncated model file.")
+
+    def __getitem__(self, field: str) -> Arrays:
+        arrays = {}
+        for name, spec in self._layout[field].items():
+            offset = self._data_start + spec["offset"]
+            arrays[name] = np.frombuffer(
+                self._buffer, dtype=np.dtype(spec["dtype"]), count=_count(spec), offset=offset
+            ).reshape(spec["shape"])
+        return arrays
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._layout)
+
+    def __len__(self) -> int:
+        return len(self._layout)
+
+    def decode(self, field: str) -> Any:
+        """Decoded value of a field, its arrays are shared with the file."""
+        return FIELD_CODECS[field][1](self[field])
+
+
+def _remove(path: str) -> None:
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def open_model_file(file_content: bytes | BinaryIO) -> ModelFile:
+    """ModelFile of an upload, a stream is copied to a temporary file to be mapped."""
+    if isinstance(file_content, bytes):
+        return ModelFile(file_content)
+    with tempfile.NamedTemporaryFile(suffix=MODEL_FILE_SUFFIX, delete=False) as spool:
+        shutil.copyfileobj(file_content, spool, 1024 * 1024)
+    return ModelFile(spool.name, temporary=True)
+
+
+def encode_model(fields: Mapping[str, Any], content_hash: str = "") -> bytes:
+    """Native model file of the decoded fields (FIELD_CODECS keys) of a model."""
+    buffer = io.BytesIO()
+    write_model_file(
+        buffer, {field: FIELD_CODECS[field][0](value) for field, value in fields.items()}, content_hash
+    )
+    return buffer.getvalue()
@@ -0,0 +1,101 @@
+import os
+import shutil
+import tempfile
+
+from contextlib import contextmanager
+from collections.abc import Iterator
+from typing import Any
+from app.model_file import FIELD_CODECS, MODEL_FILE_SUFFIX, ModelFile, write_model_file
+from app.settings import PARSE_CACHE_DIR, PARSE_CACHE_MAX_BYTES
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None  # type: ignore
+    import msvcrt
+
+
+class ParseCache:
+    """On-disk cache of parsed entities shared by all worker processes.
+
+    Entries are directories named after a key, the fingerprint of the sheets the
+    fields were parsed from (or the hash of the upload), holding one native model
+    file (see app.model_file) per parsed field, memory mapped when read. Files are
+    written to a temporary name and renamed, so readers never see partial entries.
+    Once the cache grows over `max_bytes` the least recently used entries are
+    evicted under a file lock.
+    """
+
+    def __init__(self, directory: str = PARSE_CACHE_DIR, max_bytes: int = PARSE_CACHE_MAX_BYTES) -> None:
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def get(self, key: str, field: str) -> Any | None:
+        """Cached value of a field, None on a miss or an unreadable entry."""
+        path = self._path(key, field)
+        try:
+            arrays = ModelFile(path)[field]
+            os.utime(os.path.dirname(path))
+        except (OSError, ValueError, KeyError):
+            return None
+        return FIELD_CODECS[field][1](arrays)
+
+    def set(self, key: str, field: str, value: Any) -> None:
+        """Store a field, a failing write (e.g. a full disk) only skips the cache."""
+        path = self._path(key, field)
+        arrays = FIELD_CODECS[field][0](value)
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                write_model_file(f, {field: arrays}, key)
+            os.replace(tmp_path, path)
+            self.evict()
+        except OSError:
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def evict(self) -> None:
+        """Remove the least recently used entries until the cache fits in max_bytes."""
+        with self._lock():
+            entries = []
+            for name in os.listdir(self.directory):
+                entry = os.path.join(self.directory, name)
+                if os.path.isdir(entry):
+                    size = sum(f.stat().st_size for f in os.scandir(entry) if f.is_file())
+                    entries.append((os.path.getmtime(entry), size, entry))
+            total = sum(size for _, size, _ in entries)
+            for _, size, entry in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                shutil.rmtree(entry, ignore_errors=True)
+                total -= size
+
+    def _path(self, key: str, field: str) -> str:
+        return os.path.join(self.directory, key, f"{field}{MODEL_FILE_SUFFIX}")
+
+    @contextmanager
+    def _lock(self) -> Iterator[None]:
+        with open(os.path.join(self.directory, ".lock"), "a+b") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def default_parse_cache() -> ParseCache | None:
+    """The shared on-disk cache, None when disabled with PARSE_CACHE_MAX_BYTES=0."""
+    if PARSE_CACHE_MAX_BYTES <= 0:
+        return None
+    return ParseCache()
@@ -0,0 +1,157 @@
+"""Ingestion of ETABS tables exported as delimited text: a zip with one .csv per table.
+
+Each file is named after its table (see `sheet_names`) and has the layout of the
+.xlsx sheet: an optional "TABLE: ..." title line, the header and the units row.
+Tables are parsed with the pyarrow engine of pandas, which reads a file on several
+threads, and tables requested together are parsed concurrently.
+"""
+import io
+import os
+import csv
+import hashlib
+import weakref
+import zipfile
+import numpy as np
+import pandas as pd  # type: ignore
+
+from collections.abc import Iterator, Mapping
+from concurrent.futures import ThreadPoolExecutor
+from functools import cached_property
+from typing import BinaryIO
+from app.parse_xlsx import spool_upload
+
+_BOM = b"\xef\xbb\xbf"
+
+
+def _csv_row(line: bytes) -> list[str]:
+    return next(csv.reader([line.decode().rstrip("\r")]), [])
+
+
+def _as_excel_cells(column: pd.Series) -> pd.Series:
+    """Numbers of a column below a unit as `pd.read_excel` reads them from the cells
+    of a sheet: whole numbers as int and the others as float."""
+    values = column.to_numpy(dtype=np.float64)
+    cells = values.astype(object)
+    whole = np.isfinite(values) & (values == np.round(values))
+    cells[whole] = values[whole].astype(np.int64).tolist()
+    return pd.Series(cells, index=column.index, name=column.name, dtype=object)
+
+
+def read_csv_table(data: bytes) -> pd.DataFrame:
+    """DataFrame of one exported table, laid out as `pd.read_excel(..., skiprows=1)`
+    reads the sheet: the header as columns and the units row as the first row.
+    Columns with a unit hold the unit and numbers like the sheet cells, columns
+    without one start with NaN, so the values also match those of the sheet."""
+    data = data.removeprefix(_BOM)
+    if data.lstrip().upper().startswith(b"TABLE:"):
+        data = data.partition(b"\n")[2]
+    header_line, units_line, body = (data.split(b"\n", 2) + [b"", b""])[:3]
+    header = _csv_row(header_line)
+    units = _csv_row(units_line) + [""] * len(header)
+    units = [unit or np.nan for unit in units[: len(header)]]
+    units_row = pd.DataFrame([units], columns=header)
+    if not body.strip():
+        return units_row
+    values = pd.read_csv(io.BytesIO(body), header=None, names=header, engine="pyarrow")
+    for column, unit in zip(header, units):
+        numeric = values[column].dtype.kind in "iuf"
+        if isinstance(unit, str) and numeric:
+            values[column] = _as_excel_cells(values[column])
+        elif not isinstance(unit, str) and not numeric:
+            # Text columns keep their dtype under the NaN, numbers become float as in the sheet.
+            units_row[column] = units_row[column].astype(values[column].dtype)
+    return pd.concat([units_row, values], ignore_index=True)
+
+
+class CsvTables(Mapping[str, pd.DataFrame]):
+    """Lazy mapping from table name to DataFrame for an uploaded zip of .csv tables,
+    with the interface of `Workbook` used by `Entities`. A table is parsed the first
+    time it is requested and then kept."""
+
+    def __init__(self, zip_content: str | bytes, temporary: bool = False) -> None:
+        self._zip_content = zip_content
+        self._dataframes: dict[str, pd.DataFrame] = {}
+        with self._open() as archive:
+            self._members = {
+                os.path.splitext(os.path.basename(info.filename))[0]: info
+                for info in archive.infolist()
+                if info.filename.lower().endswith(".csv")
+            }
+        # Spooled uploads are removed together with the tables.
+        if temporary and isinstance(zip_content, str):
+            weakref.finalize(self, os.remove, zip_content)
+
+    def __getitem__(self, table: str) -> pd.DataFrame:
+        if table not in self._members:
+            raise KeyError(table)
+        if table not in self._dataframes:
+            self._dataframes[table] = self._read(table)
+        return self._dataframes[table]
+
+    def __contains__(self, table: object) -> bool:
+        return table in self._members
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._members)
+
+    def __len__(self) -> int:
+        return len(self._members)
+
+    @property
+    def parsed_sheets(self) -> list[str]:
+        """Tables read from the file so far."""
+        return list(self._dataframes)
+
+    @cached_property
+    def fingerprints(self) -> dict[str, str]:
+        """Content fingerprint of each table, from the CRC-32 and size of its file."""
+        return {
+            table: hashlib.sha256(f"{info.CRC}:{info.file_size}".encode()).hexdigest()
+            for table, info in self._members.items()
+        }
+
+    def load(self, tables: list[str]) -> dict[str, pd.DataFrame]:
+        """Parse several tables concurrently."""
+        missing = [table for table in tables if table not in self._dataframes]
+        for table in missing:
+            if table not in self._members:
+                raise KeyError(table)
+        if len(missing) > 1:
+            with ThreadPoolExecutor(max_workers=len(missing)) as executor:
+                self._dataframes.update(zip(missing, executor.map(self._read, missing)))
+        return {table: self[table] for table in tables}
+
+    def prefetch(self, tables: list[str]) -> None:
+        """Parse the tables a field is about to read together."""
+        self.load([table for table in tables if table in self._members])
+
+    def _open(self) -> zipfile.ZipFile:
+        if isinstance(self._zip_content, str):
+            return zipfile.ZipFile(self._zip_content)
+        return zipfile.ZipFile(io.BytesIO(self._zip_content))
+
+    def _read(self, table: str) -> pd.DataFrame:
+        with self._open() as archive:
+            data = archive.read(self._members[table])
+        return read_csv_table(data)
+
+
+def is_csv_zip(file_content: bytes | BinaryIO) -> bool:
+    """Whether an upload is a zip of .csv tables (and not an .xlsx), a stream is
+    rewound afterwards."""
+    stream = io.BytesIO(file_content) if isinstance(file_content, bytes) else file_content
+    try:
+        with zipfile.ZipFile(stream) as archive:
+            names = archive.namelist()
+    except zipfile.BadZipFile:
+        return False
+    finally:
+        stream.seek(0)
+    return "xl/workbook.xml" not in names and any(name.lower().endswith(".csv") for name in names)
+
+
+def open_csv_tables(file_content: bytes | BinaryIO) -> tuple[CsvTables, str]:
+    """Tables of an uploaded zip and the sha256 of its content, large uploads are
+    copied to a temporary file first."""
+    content, content_hash = spool_upload(file_content, ".zip")
+    return CsvTables(content, temporary=isinstance(content, str)), content_hash
@@ -1,16 +1,25 @@
 import io
+import os
+import atexit
+import hashlib
+import tempfile
+import threading
+import weakref
+import zipfile
+import numpy as np
+import openpyxl  # type: ignore
 import pandas as pd  # type: ignore
 
-from typing import IO, Any
-from app.models import (
-    Node,
-    Frame,
-    Section,
-    CombForcesDict,
-    ForceEntry,
-    DispEntry,
-    JoinDispDict,
-)
+from xml.etree import ElementTree
+from functools import cached_property
+from numpy.typing import NDArray
+from collections.abc import Iterator, Mapping
+from concurrent.futures import ProcessPoolExecutor
+from typing import IO, Any, BinaryIO
+from app.geometry import Geometry
+from app.models import Section
+from app.results import InternalForces, JointDisplacements, JointReactions, FORCE_COMPONENTS, DISP_COMPONENTS
+from app.settings import STREAM_CHUNK_ROWS, STREAM_MIN_BYTES, PARSE_WORKERS
 
 
 sheet_names = [
@@ -30,242 +39,417 @@ sheet_names = [
 
 
 
-def extract_sheets(file_content: str | bytes, sheet_name=sheet_names) -> dict[str, pd.DataFrame]:
-    """Extract the relevant sheets from the uploaded file."""
-    dataframes: dict[str, pd.DataFrame] = {}
-    excel_data: str | IO[bytes]
+class Workbook(Mapping[str, pd.DataFrame]):
+    """Lazy mapping from sheet name to DataFrame for an uploaded file.
+    A sheet is read with `pd.read_excel` the first time it is requested and then kept,
+    so callers only pay for the sheets they actually use.
 
-    # For testing excel data is a path for prod is IO[bytes]
-    if isinstance(file_content, str):
-        excel_data = file_content
+    In streaming mode the large result sheets can also be read in chunks of
+    `chunk_rows` rows with `iter_chunks`, without ever holding the whole sheet.
+
+    With `max_workers` > 1, several sheets requested at once are parsed in parallel
+    by a process pool, each worker opening its own reader on the same file."""
+
+    def __init__(
+        self,
+        file_content: str | bytes,
+        sheet_name: list[str] = sheet_names,
+        streaming: bool = False,
+        chunk_rows: int = STREAM_CHUNK_ROWS,
+        temporary: bool = False,
+        max_workers: int = PARSE_WORKERS,
+    ) -> None:
+        self._file_content = file_content
+        self._sheet_names = list(sheet_name)
+        self._dataframes: dict[str, pd.DataFrame] = {}
+        self._streamed: set[str] = set()
+        self._excel_file: pd.ExcelFile | None = None
+        # The reader of whole sheets is shared, fields parsed by several threads take turns.
+        self._read_lock = threading.Lock()
+        self.streaming = streaming
+        self.chunk_rows = chunk_rows
+        self.max_workers = max_workers
+        # Spooled uploads are removed together with the workbook.
+        if temporary and isinstance(file_content, str):
+            weakref.finalize(self, os.remove, file_content)
+
+    def __getitem__(self, sheet: str) -> pd.DataFrame:
+        if sheet not in self._sheet_names:
+            raise KeyError(sheet)
+        with self._read_lock:
+            if sheet not in self._dataframes:
+                self._dataframes[sheet] = pd.read_excel(self._open(), sheet_name=sheet, skiprows=1)
+            return self._dataframes[sheet]
+
+    def __contains__(self, sheet: object) -> bool:
+        return sheet in self._sheet_names
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._sheet_names)
+
+    def __len__(self) -> int:
+        return len(self._sheet_names)
+
+    @property
+    def parsed_sheets(self) -> list[str]:
+        """Sheets read from the file so far, whole or streamed."""
+        return [sheet for sheet in self._sheet_names if sheet in self._dataframes or sheet in self._streamed]
+
+    @cached_property
+    def fingerprints(self) -> dict[str, str]:
+        """Content fingerprint of each sheet, see `sheet_fingerprints`."""
+        return sheet_fingerprints(self._excel_data())
+
+    def load(self, sheets: list[str]) -> dict[str, pd.DataFrame]:
+        """Read several whole sheets, in parallel when the workbook has workers."""
+        missing = [sheet for sheet in sheets if sheet not in self._dataframes]
+        for sheet in missing:
+            if sheet not in self._sheet_names:
+                raise KeyError(sheet)
+        if self.max_workers > 1 and len(missing) > 1:
+            parsed = _parse_in_pool(self, missing, None, streaming=False)
+            with self._read_lock:
+                # Keep sheets another thread read meanwhile.
+                for sheet, df in zip(missing, parsed):
+                    self._dataframes.setdefault(sheet, df)
+        return {sheet: self[sheet] for sheet in sheets}
+
+    def prefetch(self, sheets: list[str]) -> None:
+        """Parse the sheets a field is about to read, in parallel when the workbook
+        has workers. In streaming mode sheets are left to be streamed on demand."""
+        if self.max_workers > 1 and not self.streaming:
+            self.load(sheets)
+
+    def iter_chunks(self, sheets: list[str], usecols: list[str] | None = None) -> Iterator[pd.DataFrame]:
+        """Rows of the sheets as consecutive DataFrames. Streams from the file in
+        streaming mode, otherwise yields each whole (cached) sheet once."""
+        for sheet in sheets:
+            if sheet not in self._sheet_names:
+                raise KeyError(sheet)
+        streamed = [sheet for sheet in sheets if self.streaming and sheet not in self._dataframes]
+        self._streamed.update(streamed)
+        if not streamed:
+            yield from self.load(sheets).values()
+        elif self.max_workers > 1 and len(sheets) > 1:
+            # Each worker streams one sheet and returns its `usecols` at once,
+            # which trades the chunk bound for wall time.
+            yield from _parse_in_pool(self, sheets, usecols, streaming=True)
+        else:
+            for sheet in sheets:
+                if sheet in streamed:
+                    yield from read_sheet_chunks(self._excel_data(), sheet, self.chunk_rows, usecols)
+                else:
+                    yield self[sheet]
+
+    def _excel_data(self) -> str | IO[bytes]:
+        # For testing excel data is a path for prod is IO[bytes]
+        if isinstance(self._file_content, str):
+            return self._file_content
+        return io.BytesIO(self._file_content)
+
+    def _open(self) -> pd.ExcelFile:
+        if self._excel_file is None:
+            self._excel_file = pd.ExcelFile(self._excel_data())
+        return self._excel_file
+
+    def close(self) -> None:
+        """Close the underlying reader, sheets already parsed stay available."""
+        with self._read_lock:
+            if self._excel_file is not None:
+                self._excel_file.close()
+                self._excel_file = None
+
+
+_MAIN_NS = "{http://schemas.openxmlformats.org/spreadsheetml/2006/main}"
+_REL_ID = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}id"
+_PACKAGE_RELS_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+
+def sheet_fingerprints(excel_data: str | IO[bytes]) -> dict[str, str]:
+    """Content fingerprint of each sheet of an .xlsx file, from the CRC-32 and size
+    of its part in the zip directory, so no sheet data is decompressed. Text cells
+    refer to the shared strings table, which is part of every fingerprint.
+    Empty for files that are not a readable .xlsx."""
+    try:
+        with zipfile.ZipFile(excel_data) as archive:
+            parts = {info.filename: info for info in archive.infolist()}
+            workbook = ElementTree.fromstring(archive.read("xl/workbook.xml"))
+            relationships = ElementTree.fromstring(archive.read("xl/_rels/workbook.xml.rels"))
+    except (OSError, KeyError, zipfile.BadZipFile, ElementTree.ParseError):
+        return {}
+
+    targets: dict[str, str] = {}
+    shared_strings = ""
+    for relationship in relationships.iter(f"{_PACKAGE_RELS_NS}Relationship"):
+        target = relationship.get("Target", "")
+        target = target.lstrip("/") if target.startswith("/") else f"xl/{target}"
+        targets[relationship.get("Id", "")] = target
+        if relationship.get("Type", "").endswith("/sharedStrings") and target in parts:
+            shared_strings = f"{parts[target].CRC}:{parts[target].file_size}"
+
+    fingerprints = {}
+    for sheet in workbook.iter(f"{_MAIN_NS}sheet"):
+        part = parts.get(targets.get(sheet.get(_REL_ID, ""), ""))
+        if part is not None:
+            key = f"{part.CRC}:{part.file_size}:{shared_strings}"
+            fingerprints[sheet.get("name", "")] = hashlib.sha256(key.encode()).hexdigest()
+    return fingerprints
+
+
+def read_sheet_chunks(
+    excel_data: str | IO[bytes],
+    sheet: str,
+    chunk_rows: int = STREAM_CHUNK_ROWS,
+    usecols: list[str] | None = None,
+) -> Iterator[pd.DataFrame]:
+    """Stream a sheet with openpyxl's read-only reader in DataFrames of at most
+    `chunk_rows` rows. The layout matches `pd.read_excel(..., skiprows=1)`: the
+    second row is the header and the units row is the first data row."""
+    workbook = openpyxl.load_workbook(excel_data, read_only=True, data_only=True)
+    try:
+        rows = workbook[sheet].iter_rows(min_row=2, values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [str(name) for name in header]
+        positions = [columns.index(col) for col in usecols] if usecols else list(range(len(columns)))
+        columns = [columns[pos] for pos in positions]
+        chunk: list[list[Any]] = []
+        for row in rows:
+            chunk.append([row[pos] if pos < len(row) else None for pos in positions])
+            if len(chunk) == chunk_rows:
+                yield pd.DataFrame(chunk, columns=columns)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame(chunk, columns=columns)
+    finally:
+        workbook.close()
+
+
+def spool_upload(file_content: bytes | BinaryIO, suffix: str = ".xlsx") -> tuple[str | bytes, str]:
+    """Content of an upload and its sha256. Uploads of at least STREAM_MIN_BYTES are
+    copied in blocks to a temporary file whose path is returned, smaller ones are
+    returned as bytes."""
+    if isinstance(file_content, bytes):
+        content_hash = hashlib.sha256(file_content).hexdigest()
+        if len(file_content) < STREAM_MIN_BYTES:
+            return file_content, content_hash
+        file_content = io.BytesIO(file_content)
+    digest = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=False) as spool:
+        for block in iter(lambda: file_content.read(1024 * 1024), b""):
+            digest.update(block)
+            spool.write(block)
+    if os.path.getsize(spool.name) < STREAM_MIN_BYTES:
+        with open(spool.name, "rb") as f:
+            small_content = f.read()
+        os.remove(spool.name)
+        return small_content, digest.hexdigest()
+    return spool.name, digest.hexdigest()
+
+
+def open_workbook(file_content: bytes | BinaryIO) -> tuple[Workbook, str]:
+    """Workbook of an upload and the sha256 of its content.
+    Small uploads are kept in memory and read whole with pandas, uploads of at least
+    STREAM_MIN_BYTES are copied to a temporary file in blocks and streamed from there."""
+    content, content_hash = spool_upload(file_content, ".xlsx")
+    if isinstance(content, bytes):
+        return Workbook(content), content_hash
+    return Workbook(content, streaming=True, temporary=True), content_hash
+
+
+def iter_sheet_chunks(
+    sheets_data: Mapping[str, pd.DataFrame], sheets: list[str], usecols: list[str] | None = None
+) -> Iterator[pd.DataFrame]:
+    """Chunks of the sheets for any sheets mapping, a plain dict yields each whole sheet."""
+    if isinstance(sheets_data, Workbook):
+        yield from sheets_data.iter_chunks(sheets, usecols)
     else:
-        excel_data = io.BytesIO(file_content)
+        for sheet in sheets:
+            yield sheets_data[sheet]
+
 
-    with pd.ExcelFile(excel_data) as excel_file:
-        for sheet in sheet_names:
-            dataframes[sheet] = pd.read_excel(excel_file, sheet_name=sheet, skiprows=1)
-    return dataframes
+def _read_sheet(
+    excel_data: str | bytes, sheet: str, usecols: list[str] | None, streaming: bool, chunk_rows: int
+) -> pd.DataFrame:
+    """Process pool task: read one sheet with a reader of its own."""
+    source: str | IO[bytes] = excel_data if isinstance(excel_data, str) else io.BytesIO(excel_data)
+    if streaming:
+        chunks = list(read_sheet_chunks(source, sheet, chunk_rows, usecols))
+        return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame(columns=usecols)
+    return pd.read_excel(source, sheet_name=sheet, skiprows=1, usecols=usecols)
 
 
-def get_load_combos(sheets_data: dict[str, pd.DataFrame]) -> list[str]:
+# Process pools owned by the app process, keyed by their number of workers,
+# shut down when the process exits.
+_pools: dict[int, ProcessPoolExecutor] = {}
+_pools_lock = threading.Lock()
+
+
+def _pool(max_workers: int) -> ProcessPoolExecutor:
+    with _pools_lock:
+        pool = _pools.get(max_workers)
+        if pool is None:
+            pool = ProcessPoolExecutor(max_workers=max_workers)
+            _pools[max_workers] = pool
+        return pool
+
+
+@atexit.register
+def shutdown_pools() -> None:
+    """Shut down the process pools, a later parse starts new ones."""
+    with _pools_lock:
+        pools = list(_pools.values())
+        _pools.clear()
+    for pool in pools:
+        pool.shutdown(cancel_futures=True)
+
+
+def _parse_in_pool(
+    workbook: Workbook, sheets: list[str], usecols: list[str] | None, streaming: bool
+) -> list[pd.DataFrame]:
+    """Read the sheets in a shared process pool, results keep the order of `sheets`.
+    A spooled upload is shared by path, in memory content is sent to each worker."""
+    pool = _pool(workbook.max_workers)
+    futures = [
+        pool.submit(_read_sheet, workbook._file_content, sheet, usecols, streaming, workbook.chunk_rows)
+        for sheet in sheets
+    ]
+    return [future.result() for future in futures]
+
+
+def get_load_combos(sheets_data: Mapping[str, pd.DataFrame]) -> list[str]:
     """Reads the file content, creates a DataFrame and get a list of load combos."""
     sheet_name = "Element Joint Forces - Frame"
-    # Create load combos list.
-    element_forces = sheets_data[sheet_name]
-    df_combination = element_forces[element_forces["Case Type"] == "Combination"]
-    combos = df_combination["Output Case"].unique().tolist()
-    return combos
+    # Create load combos list, in order of first appearance.
+    combos: dict[str, None] = {}
+    for element_forces in iter_sheet_chunks(sheets_data, [sheet_name], ["Output Case", "Case Type"]):
+        df_combination = element_forces[element_forces["Case Type"] == "Combination"]
+        combos.update(dict.fromkeys(df_combination["Output Case"].unique().tolist()))
+    return list(combos)
 
 
-def get_internal_loads(sheets_data: dict[str, pd.DataFrame]) -> CombForcesDict:
+def get_internal_loads(sheets_data: Mapping[str, pd.DataFrame]) -> InternalForces:
     """Read the pd.DataFrame and returns P, V2, V3, T, M2, M3 for each load combo and for each frame id"""
     beam_sheet_name = "Element Forces - Beams"
     columns_sheet_name = "Element Forces - Columns"
-    df_beams = sheets_data[beam_sheet_name]
-    df_columns = sheets_data[columns_sheet_name]
-    # Combine columsn and beam dfs.
-    element_forces = pd.concat([df_beams, df_columns], ignore_index=True)
-    df_combination = element_forces[element_forces["Case Type"] == "Combination"]
-    # Stores the load in a typedict
-    comb_forces_dict: CombForcesDict = {}
-    # Group the DataFrame by 'Unique Name', 'Output Case', and 'Joint'
-    grouped = df_combination.groupby(["Unique Name", "Output Case", "Station"])
-    for (unique_name, output_case, station), group in grouped:
-        unique_name = str(int(unique_name))
-        if unique_name not in comb_forces_dict:
-            comb_forces_dict[unique_name] = {}
-        if output_case not in comb_forces_dict[unique_name]:
-            comb_forces_dict[unique_name][output_case] = {}
-        entries = []
-        for idx, row in group.iterrows():
-            entry = ForceEntry(
-                P=row["P"],
-                V2=row["V2"],
-                V3=row["V3"],
-                T=row["T"],
-                M2=row["M2"],
-                M3=row["M3"],
-            )
-            entries.append(entry)
-        comb_forces_dict[unique_name][output_case][station] = entries
-
-    return comb_forces_dict
-
-
-def get_entities(
-    file_content: str | bytes,
-) -> tuple[
-    dict[str, Node],
-    dict[str, Frame],
-    dict[str, dict],
-    CombForcesDict,
-    JoinDispDict,
-    list[str],
-    list[dict[str, Any]]
-]:
-    """Process the file_content using `extract_sheets` and get a list of DataFrames
-    that are use to get the entities of the model :Node, Frames, Frame Sections, Internal Loads"""
-    # Output data models.
-    nodes_dict: dict[str, Node] = {}
-    frame_dicts: dict[str, Frame] = {}
-    section_dicts: dict[str, dict] = {}
-    comb_forces_dict: CombForcesDict  # Internal loads.
-    joint_disp_dict: JoinDispDict  # Displacement
-    list_load_combs: list[str]
-    # Get the df for each entity from each.
-    sheets_data: dict[str, pd.DataFrame] = extract_sheets(file_content)
+    usecols = ["Unique Name", "Output Case", "Case Type", "Station", *FORCE_COMPONENTS]
+    # Combine beam and column rows, one chunk at a time.
+    df_combination = (
+        chunk[chunk["Case Type"] == "Combination"]
+        for chunk in iter_sheet_chunks(sheets_data, [beam_sheet_name, columns_sheet_name], usecols)
+    )
+    # Stores the loads in columnar arrays indexed by frame, combo and station.
+    return InternalForces.from_chunks(df_combination)
+
+
+def get_nodes(sheets_data: Mapping[str, pd.DataFrame]) -> tuple[NDArray[np.int64], NDArray[np.float64]]:
+    """Joint ids and their (N, 3) global coordinates."""
     joints_df = sheets_data["Objects and Elements - Joints"]
-    beam_df = sheets_data["Beam Object Connectivity"]
-    column_df = sheets_data["Column Object Connectivity"]
-    frame_assigns_summary_df = sheets_data["Frame Assigns - Sect Prop"]
-    # 1. Create Nodes.
     joints_df_cleaned = joints_df.dropna(
         subset=["Object Name", "Global X", "Global Y", "Global Z", "Object Type"]
     )
-    for _, row in joints_df_cleaned.iterrows():
-        if row["Object Type"] == "Joint":
-            node_id = int(row["Object Name"])
-            x = float(row["Global X"])
-            y = float(row["Global Y"])
-            z = float(row["Global Z"])
-            node = Node(id=node_id, x=x, y=y, z=z)
-            nodes_dict.update({str(node_id): node})
-
-    # 2.0 Create Frames.
+    joints_df_cleaned = joints_df_cleaned[joints_df_cleaned["Object Type"] == "Joint"]
+    node_ids = joints_df_cleaned["Object Name"].to_numpy(dtype=np.float64).astype(np.int64)
+    coords = joints_df_cleaned[["Global X", "Global Y", "Global Z"]].to_numpy(dtype=np.float64)
+    return node_ids, coords
+
+
+def get_frames(sheets_data: Mapping[str, pd.DataFrame]) -> tuple[NDArray[np.int64], NDArray[np.int64]]:
+    """Frame ids and their (M, 2) nodeI/nodeJ connectivity, columns first."""
+    beam_df = sheets_data["Beam Object Connectivity"]
+    column_df = sheets_data["Column Object Connectivity"]
     ## Join beam_df and column_df to avoid repetition.
     element_frames_df = pd.concat([column_df, beam_df], ignore_index=True)
     element_frames_df = element_frames_df.dropna(
         subset=["Unique Name", "UniquePtI", "UniquePtJ"]
     )
-    for _, row in element_frames_df.iterrows():
-        if not isinstance(row["Unique Name"], str):  # avoid 'Global'
-            frame_id = int(row["Unique Name"])
-            nodeI = int(row["UniquePtI"])
-            nodeJ = int(row["UniquePtJ"])
-            frame = Frame(id=frame_id, nodeI=nodeI, nodeJ=nodeJ)
-            frame_dicts.update({str(frame_id): frame})
-    # 3.0 Create sections.
+    # Non numeric names are summary rows such as 'Global'.
+    frame_names = pd.to_numeric(element_frames_df["Unique Name"], errors="coerce")
+    element_frames_df = element_frames_df[frame_names.notna()]
+    frame_ids = frame_names[frame_names.notna()].to_numpy(dtype=np.float64).astype(np.int64)
+    connectivity = (
+        element_frames_df[["UniquePtI", "UniquePtJ"]].to_numpy(dtype=np.float64).astype(np.int64)
+    )
+    return frame_ids, connectivity
+
+
+def get_geometry(sheets_data: Mapping[str, pd.DataFrame]) -> Geometry:
+    """Compact joints and frames of the model, see app.geometry."""
+    node_ids, coords = get_nodes(sheets_data)
+    frame_ids, connectivity = get_frames(sheets_data)
+    return Geometry.from_arrays(node_ids, coords, frame_ids, connectivity)
+
+
+def get_sections(sheets_data: Mapping[str, pd.DataFrame]) -> dict[str, dict]:
+    """Frame ids assigned to each section property."""
+    frame_assigns_summary_df = sheets_data["Frame Assigns - Sect Prop"]
     frame_assigns_summary_df_cleaned = frame_assigns_summary_df.dropna(
         subset=["Section Property", "UniqueName"]
     )
-    section_names = frame_assigns_summary_df_cleaned["Section Property"].unique()
-    ## Iterate over the sections.
-    for section_name in section_names:
-        section_df = frame_assigns_summary_df_cleaned[
-            frame_assigns_summary_df_cleaned["Section Property"] == section_name
-        ]
-        frame_ids = section_df["UniqueName"].tolist()
-        section = Section(name=section_name, frame_ids=frame_ids)
-        section_dicts.update({section_name: section.model_dump()})
-    # 4.0 Gets Member internal loads
-    comb_forces_dict = get_internal_loads(sheets_data=sheets_data)
-    # 5.0 Get displacements
-    joint_disp_dict = get_displacements(sheets_data=sheets_data)
-    # 6.0 Get load combos
-    list_load_combs = get_load_combos(sheets_data=sheets_data)
-    # 7.0 Get reactions loads and support coords.
-    reaction_payload = process_etabs_file(data_sheet=sheets_data)
-    # 8.0 Model Context
-    model_context = get_model_ctx(data_sheet=sheets_data)
-
-    return (
-        nodes_dict,
-        frame_dicts,
-        section_dicts,
-        comb_forces_dict,
-        joint_disp_dict,
-        list_load_combs,
-        reaction_payload,
-        model_context
-    )
+    grouped = frame_assigns_summary_df_cleaned.groupby("Section Property", sort=False)["UniqueName"]
+    return {
+        section_name: Section(name=section_name, frame_ids=frame_ids).model_dump()
+        for section_name, frame_ids in grouped.agg(list).items()
+    }
 
 
-def get_displacements(sheets_data: dict[str, pd.DataFrame]) -> JoinDispDict:
+def get_displacements(sheets_data: Mapping[str, pd.DataFrame]) -> JointDisplacements:
     """
     Get the displacements from a DataFrame for each node.
     """
     # Sheet name.
     joint_disp_sheet_name = "Joint Displacements"
-    # Get sheet data.
-    df_jnt_disp = sheets_data[joint_disp_sheet_name]
-    # Filter by "Combination".
-    df_combination = df_jnt_disp[df_jnt_disp["Case Type"] == "Combination"]
-    # Group the data.
-    grouped = df_combination.groupby(["Unique Name", "Output Case"])
-    # Data structure to stored displacement.
-    joint_disp_dict: JoinDispDict = {}
-    for (unique_name, output_case), group in grouped:
-        # Due memoize this need to be converted first to int then to str!
-        unique_name = str(int(unique_name))
-        # Populate keys as nodes ids and create empty dict.
-        if unique_name not in joint_disp_dict:
-            joint_disp_dict[unique_name] = {}
-        # Populate load cases and crates empty dict.
-        if output_case not in joint_disp_dict[unique_name]:
-            joint_disp_dict[unique_name][output_case] = []
-        # Populate displacements entries
-        entries: list[DispEntry] = []
-        for idx, row in group.iterrows():
-            entry = DispEntry(
-                Ux=row["Ux"],
-                Uy=row["Uy"],
-                Uz=row["Uz"],
-            )
-            entries.append(entry)
-        # Store displacements.
-        joint_disp_dict[unique_name][output_case] = entries
-
-    return joint_disp_dict
-
-def get_modal_parameters(sheets_data: dict[str, 'pd.DataFrame']) -> str:
+    usecols = ["Unique Name", "Output Case", "Case Type", *DISP_COMPONENTS]
+    # Filter each chunk of the sheet by "Combination".
+    df_combination = (
+        chunk[chunk["Case Type"] == "Combination"]
+        for chunk in iter_sheet_chunks(sheets_data, [joint_disp_sheet_name], usecols)
+    )
+    # Stores Ux, Uy, Uz in columnar arrays indexed by joint and combo.
+    return JointDisplacements.from_chunks(df_combination)
+
+def get_modal_parameters(sheets_data: Mapping[str, pd.DataFrame]) -> str:
     # Select the appropriate sheet
     sheet_name = "Modal Periods And Frequencies"
-    modal_df = sheets_data[sheet_name]
+    # The first row holds the units.
+    modal_df = sheets_data[sheet_name].iloc[1:]
     # Define the markdown table header and separator rows
     header = "| Mode # | Period [s] | Frequency [Hz] |"
     separator = "| ------ | ---------- | -------------- |"
-    # Start the table with header and separator
-    rows = [header, separator]
-    # Iterate over the DataFrame and add rows for indices greater than 1
-    for index, row in modal_df.iterrows():
-        if index > 0:
-            mode_val = row["Mode"]
-            period_val = round(row["Period"], 2)
-            frequency_val = round(row["Frequency"], 2)
-            rows.append(f"| {mode_val} | {period_val} | {frequency_val} |")
+    # Format all rows at once.
+    mode_val = modal_df["Mode"].astype(str)
+    period_val = modal_df["Period"].round(2).astype(str)
+    frequency_val = modal_df["Frequency"].round(2).astype(str)
+    table_rows = "| " + mode_val + " | " + period_val + " | " + frequency_val + " |"
     # Join all rows into a single markdown string and return it
-    markdown_table = "\n".join(rows)
+    markdown_table = "\n".join([header, separator, *table_rows.tolist()])
     return markdown_table
 
-def get_material_bill(sheets_data: dict[str, 'pd.DataFrame']) -> str:
+def get_material_bill(sheets_data: Mapping[str, pd.DataFrame]) -> str:
     # Select the appropriate sheet
     sheet_name = "Material List by Section Prop"
-    df = sheets_data[sheet_name]
-    df = df.fillna("-")
+    # The first row holds the units.
+    df = sheets_data[sheet_name].fillna("-").iloc[1:]
     # Define the markdown table header and separator rows
     header = "| Section | Object Type | Number Pieces | Length (m) | Weight (kN) |"
     separator = "| ------- | ----------- | ------------- | ---------- | ----------- |"
-    # Start the table with header and separator
-    rows = [header, separator]
-    # Iterate over the DataFrame and add rows for indices greater than 0
-    for index, row in df.iterrows():
-        if index > 0:
-            section_val = row["Section"]
-            object_type_val = row["Object Type"]
-            number_pieces_val = row["Number Pieces"]
-            if not isinstance(row["Length"], str):
-                length_val = round(row["Length"],2)
-                weight_val = round(row["Weight"],2)
-            # Add a row to the table
-            rows.append(
-                f"| {section_val} | {object_type_val} | {number_pieces_val} | "
-                f"{length_val} | {weight_val} | "
-            )
+    # Rows without a numeric length repeat the previous length and weight.
+    has_length = pd.to_numeric(df["Length"], errors="coerce").notna()
+    length_val = df["Length"].where(has_length).ffill().round(2)
+    weight_val = df["Weight"].where(has_length).ffill().round(2)
+    table_rows = (
+        "| " + df["Section"].astype(str)
+        + " | " + df["Object Type"].astype(str)
+        + " | " + df["Number Pieces"].astype(str)
+        + " | " + length_val.astype(str)
+        + " | " + weight_val.astype(str) + " | "
+    )
     # Join all rows into a single markdown string
-    markdown_table = "\n".join(rows)
+    markdown_table = "\n".join([header, separator, *table_rows.tolist()])
     return markdown_table
 
-def get_model_ctx(data_sheet: dict[str, pd.DataFrame])->str:
+def get_model_ctx(data_sheet: Mapping[str, pd.DataFrame])->str:
     """Get the model context from the xlsx file."""
     # Get modal table.
     modal_table = get_modal_parameters(data_sheet)
@@ -283,17 +467,17 @@ def get_model_ctx(data_sheet: dict[str, pd.DataFrame])->str:
     return model_ctx
 
 
-def process_etabs_file(data_sheet: dict[str, pd.DataFrame]) -> list[dict[str, Any]]:
+def get_reactions(data_sheet: Mapping[str, pd.DataFrame]) -> JointReactions:
     """Get the reactions load and support node cords for tools usage!"""
     # Process the 'Joint Reactions' dataframe
-    loads_df = data_sheet["Joint Reactions"].dropna(subset=["Unique Name", "Output Case"]).copy()
+    loads_df = data_sheet["Joint Reactions"].dropna(subset=["Unique Name", "Output Case"])
 
     # Process the 'Objects and Elements - Joints' dataframe
     cords = data_sheet["Objects and Elements - Joints"].dropna(
         subset=["Element Name", "Object Name", "Global X", "Global Y", "Global Z"]
-    ).copy()
-    cords = cords.rename(columns={"Object Name": "Unique Name"})
+    )
+    cords = cords.rename(columns={"Object Name": "Unique Name"})[["Unique Name", "Global X", "Global Y", "Global Z"]]
 
     # Merge loads and cords dataframe
     merged_df = pd.merge(loads_df, cords, on="Unique Name", how="inner")
-    return merged_df.reset_index(drop=True).to_dict(orient="records")
+    return JointReactions.from_frame(merged_df)
@@ -0,0 +1,123 @@
+"""Background warm-up of uploaded models.
+
+Once per uploaded model (by the hash of its content), a worker pool owned by the app
+process computes the fields of its entities (parsing the sheets, building the envelopes and the station
+mesh) and renders the figures most conversations start with, so the first chat
+message and view find them ready instead of computing them inline. Entities compute
+each field once, so a request that needs a field being warmed waits for it.
+"""
+import logging
+import threading
+import time
+
+from collections.abc import Callable, Sequence
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Literal
+from app.cache import LRUCache
+from app.entities import Entities
+from app.settings import PREWARM_WORKERS
+
+logger = logging.getLogger(__name__)
+
+WarmupState = Literal["loading", "ready", "failed"]
+# A named step of the warm-up and the function computing its result from the entities.
+WarmupStep = tuple[str, Callable[[Entities], Any]]
+
+
+class Warmup:
+    """Warm-up of the entities of one upload: its steps run in order in the worker
+    pool, and `result` waits for a step and returns what it computed."""
+
+    def __init__(self, entities: Entities, steps: Sequence[WarmupStep]) -> None:
+        self.entities = entities
+        self.steps = [name for name, _ in steps]
+        self.current: str | None = None
+        self._functions = dict(steps)
+        self._results: dict[str, Any] = {}
+        self._errors: dict[str, Exception] = {}
+        self._done = {name: threading.Event() for name in self.steps}
+
+    def run(self) -> None:
+        """Run all steps, a failing step is logged and does not stop the others."""
+        for name in self.steps:
+            self.current = name
+            start = time.perf_counter()
+            try:
+                self._results[name] = self._functions[name](self.entities)
+                logger.info(f"Warmed up {name} in {time.perf_counter() - start:.2f}s")
+            except Exception as e:
+                logger.warning(f"Warm-up of {name} failed: {e}")
+                self._errors[name] = e
+            finally:
+                self._done[name].set()
+        self.current = None
+
+    @property
+    def state(self) -> WarmupState:
+        if not all(done.is_set() for done in self._done.values()):
+            return "loading"
+        return "failed" if self._errors else "ready"
+
+    def progress(self) -> dict[str, Any]:
+        """State of the warm-up for the UI, e.g. to show "model loading"."""
+        return {
+            "state": self.state,
+            "step": self.current,
+            "done": sum(done.is_set() for done in self._done.values()),
+            "total": len(self.steps),
+            "failed": list(self._errors),
+        }
+
+    def result(self, step: str, timeout: float | None = None) -> Any:
+        """Result of a step once it is done, raising its error if it failed."""
+        if not self._done[step].wait(timeout):
+            raise TimeoutError(f"Warm-up of {step} did not finish in {timeout}s")
+        if step in self._errors:
+            raise self._errors[step]
+        return self._results[step]
+
+
+# Warm-ups of the last uploaded models, keyed by the hash of their content.
+_warmups: LRUCache[str, Warmup] = LRUCache(max_items=4)
+_start_lock = threading.Lock()
+_executor: ThreadPoolExecutor | None = None
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=PREWARM_WORKERS, thread_name_prefix="prewarm")
+    return _executor
+
+
+def start_warmup(entities: Entities, steps: Sequence[WarmupStep]) -> Warmup | None:
+    """Warm-up of the entities, started in the worker pool on the first call for an
+    upload hash, later calls return it. None when warm-up is disabled with
+    PREWARM_WORKERS=0."""
+    if PREWARM_WORKERS <= 0:
+        return None
+    with _start_lock:
+        warmup = _warmups.get(entities.content_hash)
+        if warmup is None:
+            warmup = Warmup(entities, steps)
+            _warmups.set(entities.content_hash, warmup)
+            _pool().submit(warmup.run)
+    return warmup
+
+
+def get_warmup(content_hash: str) -> Warmup | None:
+    """Warm-up started for an upload, None if there is none."""
+    return _warmups.get(content_hash)
+
+
+def warm_result(entities: Entities, step: str, wait: bool = True) -> Any | None:
+    """Result of a warm-up step of the upload of the entities once it is done, None
+    when the upload is not warmed up or the step failed. Without `wait` it is also
+    None while the step is not done yet."""
+    warmup = get_warmup(entities.content_hash)
+    if warmup is None or step not in warmup.steps:
+        return None
+    try:
+        return warmup.result(step, timeout=None if wait else 0)
+    except Exception:
+        return None
@@ -0,0 +1,392 @@
+import numpy as np
+import pandas as pd  # type: ignore
+
+from numpy.typing import NDArray
+from collections.abc import Iterable
+from typing import Literal, NamedTuple
+
+ForceKey = Literal["P", "V2", "V3", "T", "M2", "M3"]
+FORCE_COMPONENTS: tuple[ForceKey, ...] = ("P", "V2", "V3", "T", "M2", "M3")
+DISP_COMPONENTS = ("Ux", "Uy", "Uz")
+REACTION_COMPONENTS = ("FX", "FY", "FZ", "MX", "MY", "MZ")
+EnvelopeKind = Literal["max", "min", "max_abs"]
+
+
+class Envelope(NamedTuple):
+    """Max, min and max-abs over all load combos of every component of a result
+    table, per item (a frame station or a joint), with the combo that governs each.
+
+    Items are sorted by id, and by station for the frame stations, so the items of
+    an id are a contiguous range starting at `item_index`. `max_abs` keeps the sign of the
+    value with the largest magnitude.
+    """
+
+    components: list[str]  # (k,) component names.
+    combos: list[str]  # (n_combos,) combo names, indexed by the *_combo arrays.
+    item_ids: NDArray[np.int64]  # (n_items,) frame or joint unique name.
+    stations: NDArray[np.float64]  # (n_items,) station along the frame, NaN for joints.
+    max: NDArray[np.float64]  # (k, n_items)
+    min: NDArray[np.float64]  # (k, n_items)
+    max_abs: NDArray[np.float64]  # (k, n_items)
+    max_combo: NDArray[np.int32]  # (k, n_items) index into combos.
+    min_combo: NDArray[np.int32]  # (k, n_items)
+    max_abs_combo: NDArray[np.int32]  # (k, n_items)
+
+    @classmethod
+    def from_rows(
+        cls,
+        components: Iterable[str],
+        combos: list[str],
+        values: NDArray[np.float64],
+        combo_codes: NDArray[np.integer],
+        item_codes: NDArray[np.integer],
+        item_ids: NDArray[np.int64],
+        stations: NDArray[np.float64] | None = None,
+    ) -> "Envelope":
+        """Envelope of the (k, n_rows) values of a result table, `item_codes` gives the
+        item (index into item_ids) of every row. Ties go to the first row, NaN values
+        only govern items without any other value."""
+        n_items = len(item_ids)
+        # Sort the rows by item once, stable so ties keep the first row.
+        order = np.argsort(np.asarray(item_codes), kind="stable")
+        bounds = np.searchsorted(np.asarray(item_codes)[order], np.arange(n_items + 1))
+        starts, counts = bounds[:-1], np.diff(bounds)
+        found = counts > 0
+        combo_codes = np.asarray(combo_codes)[order]
+        envelope: dict[str, list[NDArray]] = {name: [] for name in ("max", "min", "max_abs")}
+        governing: dict[str, list[NDArray]] = {name: [] for name in ("max", "min", "max_abs")}
+        for component in values:
+            sorted_values = component[order]
+            keys = {"max": sorted_values, "min": -sorted_values, "max_abs": np.abs(sorted_values)}
+            for name, key in keys.items():
+                picked = _first_max(key, starts[found], counts[found])
+                value = np.full(n_items, np.nan)
+                combo = np.full(n_items, -1, dtype=np.int32)
+                value[found] = sorted_values[picked]
+                combo[found] = combo_codes[picked]
+                envelope[name].append(value)
+                governing[name].append(combo)
+        return cls(
+            components=list(components),
+            combos=combos,
+            item_ids=item_ids,
+            stations=np.full(n_items, np.nan) if stations is None else stations,
+            **{name: np.array(arrays, dtype=np.float64).reshape(len(values), n_items) for name, arrays in envelope.items()},
+            **{
+                f"{name}_combo": np.array(arrays, dtype=np.int32).reshape(len(values), n_items)
+                for name, arrays in governing.items()
+            },
+        )
+
+    def component(self, key: str, kind: EnvelopeKind = "max_abs") -> NDArray[np.float64]:
+        """Envelope values of a component for all items."""
+        return getattr(self, kind)[self.components.index(key)]
+
+    def governing_combos(self, key: str, kind: EnvelopeKind = "max_abs") -> list[str]:
+        """Name of the combo that governs the envelope of a component for all items."""
+        codes = getattr(self, f"{kind}_combo")[self.components.index(key)]
+        return [self.combos[code] if code >= 0 else "" for code in codes.tolist()]
+
+    def item_index(self, item_ids: NDArray[np.int64]) -> NDArray[np.int64]:
+        """Position of the first item of each frame or joint unique name, -1 for ids
+        without results. Joints have a single item."""
+        item_ids = np.asarray(item_ids, dtype=np.int64)
+        if len(self.item_ids) == 0:
+            return np.full(len(item_ids), -1, dtype=np.int64)
+        idx = np.clip(np.searchsorted(self.item_ids, item_ids), 0, len(self.item_ids) - 1)
+        return np.where(self.item_ids[idx] == item_ids, idx, -1)
+
+
+class InternalForces(NamedTuple):
+    """Columnar store of the frame internal loads for every load combination.
+
+    Rows are sorted by frame, combo and station. `offsets` holds the row range of
+    each (frame, combo) pair, so the rows of frame `f` for combo `c` are
+    `offsets[f * n_combos + c]:offsets[f * n_combos + c + 1]`.
+    """
+
+    frame_ids: NDArray[np.int64]  # (n_frames,) sorted frame unique names.
+    combos: list[str]  # (n_combos,) sorted combo names.
+    frame_codes: NDArray[np.int32]  # (n_rows,) index into frame_ids.
+    combo_codes: NDArray[np.int32]  # (n_rows,) index into combos.
+    station_codes: NDArray[np.int32]  # (n_rows,) rank of the station along its frame.
+    stations: NDArray[np.float64]  # (n_rows,) station distance from nodeI.
+    values: NDArray[np.float64]  # (6, n_rows) P, V2, V3, T, M2, M3.
+    offsets: NDArray[np.int64]  # (n_frames * n_combos + 1,) row offsets.
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "InternalForces":
+        """Build the store from the rows of the ETABS element forces sheets."""
+        return cls.from_chunks([df])
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[pd.DataFrame]) -> "InternalForces":
+        """Build the store from consecutive row chunks of the element forces sheets."""
+        names, combos, combo_codes, columns = _collect_rows(
+            chunks, ["Station", *FORCE_COMPONENTS], required_columns=("Station",)
+        )
+        frame_ids, frame_codes = np.unique(names, return_inverse=True)
+        stations, values = columns[0], columns[1:]
+        # Sort rows by frame, combo and station (stable, so duplicates keep sheet order).
+        order = np.lexsort((stations, combo_codes, frame_codes))
+        frame_codes = frame_codes[order].astype(np.int32)
+        combo_codes = combo_codes[order].astype(np.int32)
+        stations = stations[order]
+        values = np.ascontiguousarray(values[:, order])
+        # Rank the distinct stations of each frame.
+        pairs, pair_codes = np.unique(
+            np.column_stack([frame_codes, stations]), axis=0, return_inverse=True
+        )
+        frame_start = np.searchsorted(pairs[:, 0], np.arange(len(frame_ids)))
+        station_codes = (pair_codes.ravel() - frame_start[frame_codes]).astype(np.int32)
+        # Row offsets of every (frame, combo) group.
+        group_keys = frame_codes.astype(np.int64) * len(combos) + combo_codes
+        offsets = np.searchsorted(group_keys, np.arange(len(frame_ids) * len(combos) + 1))
+        return cls(
+            frame_ids=frame_ids,
+            combos=combos,
+            frame_codes=frame_codes,
+            combo_codes=combo_codes,
+            station_codes=station_codes,
+            stations=stations,
+            values=values,
+            offsets=offsets.astype(np.int64),
+        )
+
+    def component(self, key: ForceKey) -> NDArray[np.float64]:
+        """Values of a single force component for all rows."""
+        return self.values[FORCE_COMPONENTS.index(key)]
+
+    def frame_indices(self, frame_ids: NDArray[np.int64]) -> NDArray[np.int64]:
+        """Positions of frame unique names in `frame_ids`, -1 for frames without loads."""
+        frame_ids = np.asarray(frame_ids, dtype=np.int64)
+        if len(self.frame_ids) == 0:
+            return np.full(len(frame_ids), -1, dtype=np.int64)
+        idx = np.clip(np.searchsorted(self.frame_ids, frame_ids), 0, len(self.frame_ids) - 1)
+        return np.where(self.frame_ids[idx] == frame_ids, idx, -1)
+
+    def combo_index(self, combo: str) -> int | None:
+        """Position of a load combo in `combos`, None if it is not in the store."""
+        try:
+            return self.combos.index(combo)
+        except ValueError:
+            return None
+
+    def case_rows(self, combo: str) -> NDArray[np.int64]:
+        """Rows of a load combo for all frames, empty if it is not in the store."""
+        combo_idx = self.combo_index(combo)
+        if combo_idx is None:
+            return np.empty(0, dtype=np.int64)
+        return _group_rows(self.offsets, len(self.frame_ids), len(self.combos), combo_idx)
+
+    def station_items(self) -> tuple[NDArray[np.int64], NDArray[np.float64]]:
+        """Distinct stations of all frames over all combos: the (n_frames + 1,) offsets
+        of the stations of each frame and the station values, sorted along each frame."""
+        counts = np.zeros(len(self.frame_ids), dtype=np.int64)
+        np.maximum.at(counts, self.frame_codes, self.station_codes.astype(np.int64) + 1)
+        station_offsets = np.concatenate([[0], np.cumsum(counts)])
+        stations = np.empty(int(station_offsets[-1]), dtype=np.float64)
+        stations[station_offsets[self.frame_codes] + self.station_codes] = self.stations
+        return station_offsets, stations
+
+    def station_max_abs(self, combo_indices: list[int]) -> NDArray[np.float64]:
+        """(len(combo_indices), 6, n_stations) value with the largest magnitude of each
+        component at every distinct station of every frame (see `station_items`) for
+        each combo. The first row wins ties, stations without rows for a combo are NaN."""
+        station_offsets, _ = self.station_items()
+        n_items = int(station_offsets[-1])
+        combo_rows = [
+            _group_rows(self.offsets, len(self.frame_ids), len(self.combos), combo_idx) for combo_idx in combo_indices
+        ]
+        rows = np.concatenate(combo_rows) if combo_rows else np.empty(0, dtype=np.int64)
+        # The rows of a combo are sorted by frame and station, so the (combo, station)
+        # groups are already consecutive.
+        positions = np.repeat(np.arange(len(combo_rows)), [len(r) for r in combo_rows])
+        groups = positions * n_items + station_offsets[self.frame_codes[rows]] + self.station_codes[rows]
+        starts = np.flatnonzero(np.diff(groups, prepend=-1))
+        counts = np.diff(np.append(starts, len(groups)))
+        result = np.full((len(combo_rows), len(FORCE_COMPONENTS), n_items), np.nan)
+        for component_idx, component in enumerate(self.values):
+            values = component[rows]
+            picked = _first_max(np.abs(values), starts, counts)
+            result[groups[starts] // n_items, component_idx, groups[starts] % n_items] = values[picked]
+        return result
+
+    def envelope(self) -> Envelope:
+        """Envelope of the forces over all combos at every distinct station of every frame."""
+        station_offsets, stations = self.station_items()
+        return Envelope.from_rows(
+            FORCE_COMPONENTS,
+            self.combos,
+            self.values,
+            self.combo_codes,
+            station_offsets[self.frame_codes] + self.station_codes,
+            item_ids=np.repeat(self.frame_ids, np.diff(station_offsets)),
+            stations=stations,
+        )
+
+
+class JointDisplacements(NamedTuple):
+    """Columnar store of the joint displacements for every load combination.
+
+    Rows are sorted by joint and combo, the rows of joint `j` for combo `c` are
+    `offsets[j * n_combos + c]:offsets[j * n_combos + c + 1]`.
+    """
+
+    joint_ids: NDArray[np.int64]  # (n_joints,) sorted joint unique names.
+    combos: list[str]  # (n_combos,) sorted combo names.
+    joint_codes: NDArray[np.int32]  # (n_rows,) index into joint_ids.
+    combo_codes: NDArray[np.int32]  # (n_rows,) index into combos.
+    values: NDArray[np.float64]  # (3, n_rows) Ux, Uy, Uz.
+    offsets: NDArray[np.int64]  # (n_joints * n_combos + 1,) row offsets.
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "JointDisplacements":
+        """Build the store from the rows of the ETABS joint displacements sheet."""
+        return cls.from_chunks([df])
+
+    @classmethod
+    def from_chunks(cls, chunks: Iterable[pd.DataFrame]) -> "JointDisplacements":
+        """Build the store from consecutive row chunks of the joint displacements sheet."""
+        names, combos, combo_codes, values = _collect_rows(chunks, list(DISP_COMPONENTS))
+        joint_ids, joint_codes = np.unique(names, return_inverse=True)
+        order = np.lexsort((combo_codes, joint_codes))
+        joint_codes = joint_codes[order].astype(np.int32)
+        combo_codes = combo_codes[order].astype(np.int32)
+        group_keys = joint_codes.astype(np.int64) * len(combos) + combo_codes
+        offsets = np.searchsorted(group_keys, np.arange(len(joint_ids) * len(combos) + 1))
+        return cls(
+            joint_ids=joint_ids,
+            combos=combos,
+            joint_codes=joint_codes,
+            combo_codes=combo_codes,
+            values=np.ascontiguousarray(values[:, order]),
+            offsets=offsets.astype(np.int64),
+        )
+
+    def case_rows(self, combo: str) -> NDArray[np.int64]:
+        """Rows of a load combo for all joints, empty if it is not in the store."""
+        if combo not in self.combos:
+            return np.empty(0, dtype=np.int64)
+        return _group_rows(self.offsets, len(self.joint_ids), len(self.combos), self.combos.index(combo))
+
+    def at(self, combo: str, joint_ids: NDArray[np.int64]) -> NDArray[np.float64]:
+        """(n, 3) Ux, Uy, Uz of the first entry of each joint for a combo.
+        Joints without results for the combo get a zero displacement."""
+        joint_ids = np.asarray(joint_ids, dtype=np.int64)
+        disp = np.zeros((len(joint_ids), len(DISP_COMPONENTS)), dtype=np.float64)
+        if combo not in self.combos or len(self.joint_ids) == 0:
+            return disp
+        pos = np.clip(np.searchsorted(self.joint_ids, joint_ids), 0, len(self.joint_ids) - 1)
+        groups = pos * len(self.combos) + self.combos.index(combo)
+        start, stop = self.offsets[groups], self.offsets[groups + 1]
+        found = (self.joint_ids[pos] == joint_ids) & (stop > start)
+        disp[found] = self.values[:, start[found]].T
+        return disp
+
+    def envelope(self) -> Envelope:
+        """Envelope of the displacements over all combos for every joint."""
+        return Envelope.from_rows(
+            DISP_COMPONENTS, self.combos, self.values, self.combo_codes, self.joint_codes, item_ids=self.joint_ids
+        )
+
+
+class JointReactions(NamedTuple):
+    """Columnar store of the support reactions, with the coordinates of their joint.
+
+    Rows keep the order of the sheet. `case_order` lists the rows grouped by output
+    case (in sheet order within a case), the rows of case `c` are
+    `case_order[case_offsets[c]:case_offsets[c + 1]]`.
+    """
+
+    joint_ids: NDArray[np.int64]  # (n_rows,) joint unique name of every row.
+    cases: list[str]  # (n_cases,) sorted output case names.
+    case_codes: NDArray[np.int32]  # (n_rows,) index into cases.
+    values: NDArray[np.float64]  # (6, n_rows) FX, FY, FZ, MX, MY, MZ.
+    coords: NDArray[np.float64]  # (3, n_rows) Global X, Y, Z of the joint.
+    case_order: NDArray[np.int64]  # (n_rows,) rows grouped by case.
+    case_offsets: NDArray[np.int64]  # (n_cases + 1,) offsets into case_order.
+
+    @classmethod
+    def from_frame(cls, df: pd.DataFrame) -> "JointReactions":
+        """Build the store from the joint reactions merged with the joint coordinates."""
+        cases, case_codes = np.unique(df["Output Case"].astype(str).to_numpy(), return_inverse=True)
+        case_codes = case_codes.ravel()
+        case_order = np.argsort(case_codes, kind="stable")
+        case_offsets = np.searchsorted(case_codes[case_order], np.arange(len(cases) + 1))
+        return cls(
+            joint_ids=df["Unique Name"].to_numpy(dtype=np.float64).astype(np.int64),
+            cases=cases.tolist(),
+            case_codes=case_codes.astype(np.int32),
+            values=np.ascontiguousarray(df.reindex(columns=list(REACTION_COMPONENTS)).to_numpy(dtype=np.float64).T),
+            coords=np.ascontiguousarray(df[["Global X", "Global Y", "Global Z"]].to_numpy(dtype=np.float64).T),
+            case_order=case_order.astype(np.int64),
+            case_offsets=case_offsets.astype(np.int64),
+        )
+
+    def component(self, key: str) -> NDArray[np.float64]:
+        """Values of a single reaction component for all rows."""
+        return self.values[REACTION_COMPONENTS.index(key)]
+
+    def case_rows(self, case: str) -> NDArray[np.int64]:
+        """Rows of an output case in sheet order, empty if it is not in the store."""
+        if case not in self.cases:
+            return np.empty(0, dtype=np.int64)
+        case_idx = self.cases.index(case)
+        return self.case_order[self.case_offsets[case_idx]:self.case_offsets[case_idx + 1]]
+
+    def envelope(self) -> Envelope:
+        """Envelope of the reactions over all cases for every joint."""
+        joint_ids, joint_codes = np.unique(self.joint_ids, return_inverse=True)
+        return Envelope.from_rows(
+            REACTION_COMPONENTS, self.cases, self.values, self.case_codes, joint_codes.ravel(), item_ids=joint_ids
+        )
+
+
+def _first_max(key: NDArray[np.float64], starts: NDArray[np.int64], counts: NDArray[np.int64]) -> NDArray[np.int64]:
+    """Position of the first largest key of each non-empty group of consecutive rows,
+    NaN keys are ignored (the first row is taken when a group only has NaN)."""
+    if len(starts) == 0:
+        return starts
+    group_max = np.repeat(np.fmax.reduceat(key, starts), counts)
+    hits = np.flatnonzero(key == group_max)
+    picked = hits[np.minimum(np.searchsorted(hits, starts), len(hits) - 1)] if len(hits) else starts
+    return np.where((picked >= starts) & (picked < starts + counts), picked, starts)
+
+
+def _group_rows(offsets: NDArray[np.int64], n_items: int, n_combos: int, combo_idx: int) -> NDArray[np.int64]:
+    """Rows of one combo in a store sorted by item and combo, from its group offsets."""
+    starts = offsets[combo_idx:n_items * n_combos:n_combos]
+    stops = offsets[combo_idx + 1:n_items * n_combos + 1:n_combos]
+    lengths = stops - starts
+    # Concatenate the ranges starts[i]:stops[i] without a Python loop.
+    group_starts = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+    return group_starts + np.arange(int(lengths.sum()), dtype=np.int64)
+
+
+def _collect_rows(
+    chunks: Iterable[pd.DataFrame], value_columns: list[str], required_columns: tuple[str, ...] = ()
+) -> tuple[NDArray[np.int64], list[str], NDArray[np.int64], NDArray[np.float64]]:
+    """Turn row chunks of a result sheet into arrays, keeping only one chunk of
+    DataFrame rows alive at a time. Returns the unique names, the sorted output
+    cases, the case code of every row and the (len(value_columns), n_rows) values."""
+    names: list[NDArray[np.int64]] = []
+    case_codes: list[NDArray[np.int64]] = []
+    values: list[NDArray[np.float64]] = []
+    cases: dict[str, int] = {}
+    for chunk in chunks:
+        chunk = chunk.dropna(subset=["Unique Name", "Output Case", *required_columns])
+        codes, uniques = pd.factorize(chunk["Output Case"].astype(str))
+        remap = np.array([cases.setdefault(case, len(cases)) for case in uniques], dtype=np.int64)
+        case_codes.append(remap[codes])
+        names.append(chunk["Unique Name"].to_numpy(dtype=np.float64).astype(np.int64))
+        values.append(chunk[value_columns].to_numpy(dtype=np.float64).T)
+    # Output cases are sorted by name, as in a groupby.
+    combos = sorted(cases)
+    rank = np.array([combos.index(case) for case in cases], dtype=np.int64)
+    return (
+        np.concatenate(names) if names else np.empty(0, dtype=np.int64),
+        combos,
+        rank[np.concatenate(case_codes)] if case_codes else np.empty(0, dtype=np.int64),
+        np.concatenate(values, axis=1) if values else np.empty((len(value_columns), 0)),
+    )
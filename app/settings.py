@@ -0,0 +1,47 @@
+"""Tunable settings of the app, read from the environment (or the .env file)."""
+import os
+import tempfile
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _env_int(name: str, default: int) -> int:
+    value = os.getenv(name)
+    return int(value) if value else default
+
+
+# Uploads of at least this many bytes are spooled to disk and their large
+# sheets are streamed in chunks instead of read whole with pd.read_excel.
+STREAM_MIN_BYTES = _env_int("STREAM_MIN_BYTES", 20 * 1024 * 1024)
+# Rows per chunk when streaming a sheet, bounds the peak memory of the parser.
+STREAM_CHUNK_ROWS = _env_int("STREAM_CHUNK_ROWS", 50_000)
+# Worker processes used to parse several sheets in parallel, 0 or 1 parses
+# them one after another in the app process.
+PARSE_WORKERS = _env_int("PARSE_WORKERS", 0)
+# Directory of the on-disk cache of parsed models, shared by all worker processes.
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR") or os.path.join(tempfile.gettempdir(), "talk-with-your-model-cache")
+# Size bound of the on-disk cache, least recently used models are evicted first.
+# 0 disables the cache.
+PARSE_CACHE_MAX_BYTES = _env_int("PARSE_CACHE_MAX_BYTES", 2 * 1024 * 1024 * 1024)
+# Above this number of members the 3D scenes draw each member as a line instead
+# of a prism (level of detail), 0 always draws prisms.
+RENDER_LOD_MEMBERS = _env_int("RENDER_LOD_MEMBERS", 20_000)
+# Float type of the numeric arrays of stored figures and scenes: "f4" (half the
+# size) or "f8" (exact).
+FIGURE_FLOAT_DTYPE = os.getenv("FIGURE_FLOAT_DTYPE") or "f4"
+# Numeric arrays of the figures sent to the view as Plotly typed arrays (base64
+# "bdata", read by plotly.js 2.28 and later), 0 sends them as plain JSON lists
+# for a PlotlyView whose plotly.js cannot decode typed arrays.
+FIGURE_TYPED_ARRAYS = _env_int("FIGURE_TYPED_ARRAYS", 1) > 0
+# zlib level of the stored figures and scenes, 0 stores them uncompressed.
+FIGURE_COMPRESS_LEVEL = _env_int("FIGURE_COMPRESS_LEVEL", 0)
+# Worker threads that warm up uploaded models in the background (parse, envelopes
+# and the first figures), 0 leaves all work to the first chat message and view.
+# Warm-ups share the GIL with the requests, one thread keeps their share small.
+PREWARM_WORKERS = _env_int("PREWARM_WORKERS", 1)
+# Bounds of the in-process cache of tool results (serialised figures), keyed by
+# model, tool and arguments.
+TOOL_CACHE_MAX_ITEMS = _env_int("TOOL_CACHE_MAX_ITEMS", 64)
+TOOL_CACHE_MAX_BYTES = _env_int("TOOL_CACHE_MAX_BYTES", 256 * 1024 * 1024)
@@ -0,0 +1,54 @@
+"""Jet colormap as a lookup table, to color many beams with one array operation.
+
+The table reproduces the 256 colors of the "jet" colormap of matplotlib, so the
+beams keep the colors they had, and matches the "jet" colorscale of the Plotly
+colorbars drawn next to them.
+"""
+import numpy as np
+
+from numpy.typing import NDArray
+
+LUT_SIZE = 256
+
+# (x, value) control points of each channel of the jet colormap.
+_JET_POINTS = {
+    "red": [(0.0, 0.0), (0.35, 0.0), (0.66, 1.0), (0.89, 1.0), (1.0, 0.5)],
+    "green": [(0.0, 0.0), (0.125, 0.0), (0.375, 1.0), (0.64, 1.0), (0.91, 0.0), (1.0, 0.0)],
+    "blue": [(0.0, 0.5), (0.11, 1.0), (0.34, 1.0), (0.65, 0.0), (1.0, 0.0)],
+}
+
+
+def _channel_lut(points: list[tuple[float, float]], n: int) -> NDArray[np.float64]:
+    """Values of a channel at n evenly spaced positions, interpolated like matplotlib does."""
+    x = np.array([p[0] for p in points]) * (n - 1)
+    y = np.array([p[1] for p in points])
+    xind = (n - 1) * np.linspace(0, 1, n)
+    ind = np.searchsorted(x, xind)[1:-1]
+    distance = (xind[1:-1] - x[ind - 1]) / (x[ind] - x[ind - 1])
+    lut = np.concatenate([[y[0]], distance * (y[ind] - y[ind - 1]) + y[ind - 1], [y[-1]]])
+    return np.clip(lut, 0.0, 1.0)
+
+
+def _hex_lut(n: int) -> NDArray[np.str_]:
+    channels = np.rint(np.column_stack([_channel_lut(_JET_POINTS[c], n) for c in ("red", "green", "blue")]) * 255)
+    return np.array([f"#{r:02x}{g:02x}{b:02x}" for r, g, b in channels.astype(int).tolist()])
+
+
+# Hex color of each of the LUT_SIZE levels of the colormap.
+JET_LUT = _hex_lut(LUT_SIZE)
+# Color of values that cannot be mapped (NaN).
+BAD_COLOR = "#000000"
+
+
+def jet_colors(values: NDArray[np.float64], vmin: float, vmax: float) -> list[str]:
+    """Hex jet color of each value, with vmin and vmax mapped to the ends of the colormap.
+    Values outside the range get the end colors, all values get the first color when
+    vmin equals vmax."""
+    values = np.asarray(values, dtype=np.float64)
+    if vmax == vmin:
+        normalized = np.zeros_like(values)
+    else:
+        normalized = (values - vmin) / (vmax - vmin)
+    bad = np.isnan(normalized)
+    levels = np.clip(np.trunc(np.where(bad, 0.0, normalized) * LUT_SIZE), 0, LUT_SIZE - 1).astype(np.int64)
+    return np.where(bad, BAD_COLOR, JET_LUT[levels]).tolist()
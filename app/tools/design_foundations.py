@@ -1,7 +1,8 @@
+import numpy as np
 import plotly.graph_objects  as go #type: ignore
 
 from collections import defaultdict
-from typing import Any
+from app.results import Envelope, JointReactions
 
 def design_foundations(axial_loads: list[float], bearing_pressure: float, min_size: float = 1000) -> list[float]:
     """Calculates the pad size using soil bearing pressure"""
@@ -12,15 +13,15 @@ def design_foundations(axial_loads: list[float], bearing_pressure: float, min_si
         pad_sizes.append(pad_size if pad_size > min_size else min_size)
     return pad_sizes
 
-def plot_foundations(merged_data: list[dict[str, Any]], load_case: str, bearing_pressure: float) -> go.Figure:
-    # Filter data based on load_case
-    filtered_data = [row for row in merged_data if row.get("Output Case") == load_case]
-    if not filtered_data:
+def plot_foundations(reactions: JointReactions, load_case: str, bearing_pressure: float) -> go.Figure:
+    # Rows of the load_case from the case index
+    rows = reactions.case_rows(load_case)
+    if len(rows) == 0:
         raise ValueError(f"No data found for load case {load_case}")
 
-    FZ_values = [row["FZ"] for row in filtered_data]
-    x_values = [row["Global X"] for row in filtered_data]
-    y_values = [row["Global Y"] for row in filtered_data]
+    FZ_values = reactions.component("FZ")[rows].tolist()
+    x_values = reactions.coords[0, rows].tolist()
+    y_values = reactions.coords[1, rows].tolist()
 
     # Compute pad sizes (in mm)
     pad_sizes = design_foundations(FZ_values, bearing_pressure)
@@ -87,29 +88,40 @@ def plot_foundations(merged_data: list[dict[str, Any]], load_case: str, bearing_
         ticktext=[f"{y / 1000:.3f}" for y in y_values],
     )
     return fig
-def plot_foundations_envelope(merged_data: list[dict[str, Any]], bearing_pressure: float) -> go.Figure:
+def plot_foundations_envelope(reactions: JointReactions, envelope: Envelope, bearing_pressure: float) -> go.Figure:
     """
     Plots foundation pads for the envelope of all load cases.
-    It finds the maximum absolute FZ at each (x, y) location across all load cases,
+    It takes the maximum absolute FZ of each joint across all load cases from the
+    precomputed reactions envelope, keeps the largest one at each (x, y) location,
     computes the required pad size for that maximum load, and plots the pads.
+    The hover text of each pad gives its load and the load case that governs it.
     """
+    # First row of each joint, in the order of envelope.item_ids (sorted joint ids)
+    _, first_rows = np.unique(reactions.joint_ids, return_index=True)
+    joint_fz = np.abs(envelope.component("FZ", "max_abs")).tolist()
+    joint_combos = envelope.governing_combos("FZ", "max_abs")
+    joint_x = reactions.coords[0, first_rows].tolist()
+    joint_y = reactions.coords[1, first_rows].tolist()
+
+    # Locations in the order they appear in the sheet
     max_fz_dict: defaultdict = defaultdict(float)
-
-    for row in merged_data:
-        x = row["Global X"]
-        y = row["Global Y"]
-        fz_value = abs(row["FZ"])
-        if fz_value > max_fz_dict[(x, y)]:
-            max_fz_dict[(x, y)] = fz_value
-
-    # Separate lists for x, y, and their corresponding max FZ
+    max_combo_dict: dict[tuple[float, float], str] = {}
+    for joint in np.argsort(first_rows, kind="stable").tolist():
+        location = (joint_x[joint], joint_y[joint])
+        if joint_fz[joint] > max_fz_dict[location]:
+            max_fz_dict[location] = joint_fz[joint]
+            max_combo_dict[location] = joint_combos[joint]
+
+    # Separate lists for x, y, and their corresponding max FZ and governing case
     x_values = []
     y_values = []
     FZ_values = []
+    governing = []
     for (x_coord, y_coord), fz_val in max_fz_dict.items():
         x_values.append(x_coord)
         y_values.append(y_coord)
         FZ_values.append(fz_val)
+        governing.append(max_combo_dict.get((x_coord, y_coord), "-"))
 
     # Compute pad sizes (in mm) for the maximum loads
     pad_sizes = design_foundations(FZ_values, bearing_pressure)
@@ -148,6 +160,8 @@ def plot_foundations_envelope(merged_data: list[dict[str, Any]], bearing_pressur
         y=y_values,
         mode="markers",
         marker=dict(color="red", size=1),
+        text=[f"FZ: {fz:.1f} kN<br>Governing: {combo}" for fz, combo in zip(FZ_values, governing)],
+        hoverinfo="text",
         showlegend=False
     ))
 
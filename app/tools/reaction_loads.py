@@ -1,19 +1,19 @@
 import plotly.graph_objects  as go #type: ignore
-from typing import Any
+from app.results import JointReactions
 
-def plot_reaction(merged_data: list[dict[str, Any]], load_case: str) -> go.Figure:
-    # Filter data based on load_case
-    filtered_data = [row for row in merged_data if row.get("Output Case") == load_case]
-    if not filtered_data:
+def plot_reaction(reactions: JointReactions, load_case: str) -> go.Figure:
+    # Rows of the load_case from the case index
+    rows = reactions.case_rows(load_case)
+    if len(rows) == 0:
         raise ValueError(f"No data found for load case {load_case}")
 
     # Determine FZ values range
-    FZ_values = [row["FZ"] for row in filtered_data]
+    FZ_values = reactions.component("FZ")[rows].tolist()
     FZ_min, FZ_max = min(FZ_values), max(FZ_values)
     # Extract x and y coordinates and create text labels for FZ values
-    x_values = [row["Global X"] for row in filtered_data]
-    y_values = [row["Global Y"] for row in filtered_data]
-    text_values = [f"{row['FZ']:.1f}" for row in filtered_data]
+    x_values = reactions.coords[0, rows].tolist()
+    y_values = reactions.coords[1, rows].tolist()
+    text_values = [f"{fz:.1f}" for fz in FZ_values]
 
     # Create plotly scatter plot
     fig = go.Figure(
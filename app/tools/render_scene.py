@@ -1,102 +1,254 @@
 import plotly.graph_objects as go #type: ignore
 import numpy as np
+import logging
 from numpy.typing import NDArray
-from app.models import Node, Frame
+from typing import Any, NamedTuple
+from app import figure_json
+from app.geometry import Geometry
+from app.settings import RENDER_LOD_MEMBERS
+from app.tools.colormap import jet_colors
 
+logger = logging.getLogger(__name__)
 
-def compute_beam_vertices(A: NDArray[np.float64], B: NDArray[np.float64], width: float = 0.1) -> NDArray[np.float64]:
+
+def compute_beams_vertices(A: NDArray[np.float64], B: NDArray[np.float64], width: float = 0.1) -> NDArray[np.float64]:
     """
-    Compute the eight vertices of a rectangular beam (prism) between endpoints A and B.
-    The beam has a square cross-section with side 'width'.
+    Compute the eight vertices of the rectangular beams (prisms) between the (n, 3)
+    endpoints A and B at once. The beams have a square cross-section with side 'width'.
+    Returns an (n, 8, 3) array, the four vertices at A followed by the four at B.
+    Zero length beams collapse to their point A.
     """
+    A = np.asarray(A, dtype=np.float64).reshape(-1, 3)
+    B = np.asarray(B, dtype=np.float64).reshape(-1, 3)
     v = B - A
-    norm_v = np.linalg.norm(v)
-    if norm_v == 0:
-        raise ValueError("Zero length beam")
-    v_hat = v / norm_v
-
-    # Choose an arbitrary vector that is not parallel to v_hat.
-    a = np.array([0, 0, 1])
-    if abs(np.dot(v_hat, a)) > 0.99:
-        a = np.array([0, 1, 0])
-    
-    # Compute two perpendicular vectors.
+    norm_v = np.linalg.norm(v, axis=1)
+    zero_length = norm_v == 0
+    v_hat = v / np.where(zero_length, 1.0, norm_v)[:, None]
+
+    # Choose an arbitrary vector that is not parallel to v_hat: Z, or Y for near vertical beams.
+    near_vertical = np.abs(v_hat[:, 2]) > 0.99
+    a = np.where(near_vertical[:, None], [0.0, 1.0, 0.0], [0.0, 0.0, 1.0])
+
+    # Compute two perpendicular vectors (zero for zero length beams).
     cross1 = np.cross(v_hat, a)
-    cross1 /= np.linalg.norm(cross1)
+    norm1 = np.linalg.norm(cross1, axis=1)
+    cross1 /= np.where(norm1 == 0, 1.0, norm1)[:, None]
     cross2 = np.cross(v_hat, cross1)
-    cross2 /= np.linalg.norm(cross2)
-    
+    norm2 = np.linalg.norm(cross2, axis=1)
+    cross2 /= np.where(norm2 == 0, 1.0, norm2)[:, None]
+
     half_width = width / 2
     cross1 *= half_width
     cross2 *= half_width
 
-    # Compute vertices at A.
-    v0 = A + cross1 + cross2
-    v1 = A + cross1 - cross2
-    v2 = A - cross1 - cross2
-    v3 = A - cross1 + cross2
-    # Compute vertices at B.
-    v4 = B + cross1 + cross2
-    v5 = B + cross1 - cross2
-    v6 = B - cross1 - cross2
-    v7 = B - cross1 + cross2
-
-    vertices = np.array([v0, v1, v2, v3, v4, v5, v6, v7])
-    return vertices
-
-def add_beam_mesh(fig: go.Figure, vertices: NDArray[np.float64], color: str ="teal") -> None:
+    # Signs of cross1 and cross2 at the four corners of the section (v0..v3, v4..v7).
+    signs = np.array([(1.0, 1.0), (1.0, -1.0), (-1.0, -1.0), (-1.0, 1.0)])
+    corners_1 = signs[None, :, 0, None] * cross1[:, None, :]
+    corners_2 = signs[None, :, 1, None] * cross2[:, None, :]
+    return np.concatenate([A[:, None] + corners_1 + corners_2, B[:, None] + corners_1 + corners_2], axis=1)
+
+# Faces of a beam (vertex indices of compute_beams_vertices).
+BEAM_FACES = [
+    (0, 1, 2, 3),  # end face at A
+    (4, 5, 6, 7),  # end face at B
+    (0, 1, 5, 4),  # side face 1
+    (1, 2, 6, 5),  # side face 2
+    (2, 3, 7, 6),  # side face 3
+    (3, 0, 4, 7)   # side face 4
+]
+# Each quadrilateral is split into two triangles.
+BEAM_TRIANGLES = np.array([triangle for a, b, c, d in BEAM_FACES for triangle in ((a, b, c), (a, c, d))])
+
+def add_beams_mesh(fig: go.Figure, vertices: NDArray[np.float64], color: str | list[str] = "teal") -> None:
     """
-    Add a Mesh3d trace representing a beam (rectangular prism) to the figure.
+    Add a single Mesh3d trace representing all beams (rectangular prisms) to the figure.
+    vertices is the (n, 8, 3) array of the vertices of each beam, color is one color
+    for all beams or the color of each beam, applied to its faces.
     Lighting parameters have been added to improve the visibility of thin beams.
     """
-    # Define faces for the beam. Each quadrilateral is split into two triangles.
-    faces = [
-        (0, 1, 2, 3),  # end face at A
-        (4, 5, 6, 7),  # end face at B
-        (0, 1, 5, 4),  # side face 1
-        (1, 2, 6, 5),  # side face 2
-        (2, 3, 7, 6),  # side face 3
-        (3, 0, 4, 7)   # side face 4
-    ]
-    
-    i_list, j_list, k_list = [], [], []
-    for a, b, c, d in faces:
-        # First triangle.
-        i_list.append(a)
-        j_list.append(b)
-        k_list.append(c)
-        # Second triangle.
-        i_list.append(a)
-        j_list.append(c)
-        k_list.append(d)
-    
-    # Extract x, y, z coordinates.
-    x = vertices[:, 0]
-    y = vertices[:, 1]
-    z = vertices[:, 2]
-    
-    beam_trace = go.Mesh3d(
-        x=x,
-        y=y,
-        z=z,
-        i=i_list,
-        j=j_list,
-        k=k_list,
-        color=color,
+    n_beams = len(vertices)
+    triangles = (BEAM_TRIANGLES[None] + 8 * np.arange(n_beams)[:, None, None]).reshape(-1, 3)
+    points = np.asarray(vertices, dtype=np.float64).reshape(-1, 3)
+    if isinstance(color, str):
+        colors = dict(color=color)
+    else:
+        colors = dict(facecolor=np.repeat(color, len(BEAM_TRIANGLES)))
+
+    beams_trace = go.Mesh3d(
+        x=points[:, 0],
+        y=points[:, 1],
+        z=points[:, 2],
+        i=triangles[:, 0],
+        j=triangles[:, 1],
+        k=triangles[:, 2],
         opacity=1.0,
         flatshading=True,
         showscale=False,
         hoverinfo='none',
-        lighting=dict(ambient=0.5, diffuse=0.8, specular=0.3, roughness=0.9)
+        lighting=dict(ambient=0.5, diffuse=0.8, specular=0.3, roughness=0.9),
+        **colors
     )
-    fig.add_trace(beam_trace)
-
-def plot_3d_scene(nodes: dict[str, Node], lines: dict[str, Frame]) -> go.Figure:
-    """Plot ETABS 3D model using rectangular cross sections"""
-    # Ensure each node is an instance of Node.
-    x_values = [node["x"] for node in nodes.values()]
-    y_values = [node["y"] for node in nodes.values()]
-    z_values = [node["z"] for node in nodes.values()]
+    fig.add_trace(beams_trace)
+
+def add_beams_lines(
+    fig: go.Figure, A: NDArray[np.float64], B: NDArray[np.float64], color: str | list[str] = "teal", width: float = 4
+) -> None:
+    """
+    Add a single Scatter3d trace drawing each beam between the (n, 3) endpoints A and B
+    as a line, the level of detail used for large models. color is one color for all
+    beams or the color of each beam.
+    """
+    # Every beam is A, B and a None separator.
+    points = np.full((len(A), 3, 3), np.nan)
+    points[:, 0] = A
+    points[:, 1] = B
+    x, y, z = [np.where(np.isnan(c), None, c).tolist() for c in points.reshape(-1, 3).T]
+    line_color = color if isinstance(color, str) else np.repeat(color, 3).tolist()
+    fig.add_trace(go.Scatter3d(
+        x=x,
+        y=y,
+        z=z,
+        mode='lines',
+        line=dict(color=line_color, width=width),
+        hoverinfo='none',
+        showlegend=False
+    ))
+
+def add_beams(
+    fig: go.Figure,
+    A: NDArray[np.float64],
+    B: NDArray[np.float64],
+    color: str | list[str] = "teal",
+    width: float = 300,
+    lod_threshold: int | None = None,
+) -> str:
+    """
+    Add the beams between the (n, 3) endpoints A and B to the figure: as one mesh of
+    prisms, or as one line trace when there are more than `lod_threshold` beams
+    (RENDER_LOD_MEMBERS by default, 0 always draws prisms). The chosen mode is
+    logged and recorded with the threshold in the layout meta of the figure.
+    Returns the mode, "prisms" or "lines".
+    """
+    if lod_threshold is None:
+        lod_threshold = RENDER_LOD_MEMBERS
+    mode = "lines" if 0 < lod_threshold < len(A) else "prisms"
+    logger.info(f"Rendering {len(A)} members as {mode} (LOD threshold {lod_threshold})")
+    if mode == "lines":
+        add_beams_lines(fig, A, B, color=color)
+    else:
+        add_beams_mesh(fig, compute_beams_vertices(A, B, width=width), color=color)
+    fig.update_layout(meta=dict(render_mode=mode, lod_threshold=lod_threshold, members=len(A)))
+    return mode
+
+
+class SceneGeometry(NamedTuple):
+    """Joints and members of a 3D scene, shared by all results drawn on the same geometry.
+    `key` identifies the geometry of a model (its content hash and kind), so it is
+    stored once and reused by every result overlay that refers to it."""
+
+    key: str
+    node_ids: NDArray[np.int64]  # (n_nodes,)
+    coords: NDArray[np.float64]  # (n_nodes, 3)
+    connectivity: NDArray[np.int32]  # (n_members, 2) indices into node_ids.
+
+    @classmethod
+    def from_geometry(cls, key: str, geometry: Geometry) -> "SceneGeometry":
+        return cls(key, geometry.node_ids, geometry.coords, geometry.connectivity)
+
+    def to_json(self) -> bytes:
+        """Compact JSON payload of the geometry, see app.figure_json."""
+        return figure_json.dumps(self._asdict())
+
+    @classmethod
+    def from_json(cls, raw: bytes) -> "SceneGeometry":
+        data = figure_json.loads(raw, arrays=True)
+        return cls(
+            key=data["key"],
+            node_ids=np.asarray(data["node_ids"], dtype=np.int64),
+            coords=np.asarray(data["coords"], dtype=np.float64).reshape(-1, 3),
+            connectivity=np.asarray(data["connectivity"], dtype=np.int32).reshape(-1, 2),
+        )
+
+
+class SceneOverlay(NamedTuple):
+    """Result drawn on a SceneGeometry: a value per member, colored with the jet
+    colormap between cmin and cmax, and the displacement of every node, drawn scaled
+    by `scale`. An overlay without values and displacements is the plain model.
+    Overlays of an envelope also give the load combo that governs each member value
+    and node displacement, shown in the hover text."""
+
+    values: NDArray[np.float64] | None = None  # (n_members,)
+    cmin: float = 0.0
+    cmax: float = 0.0
+    colorbar_title: str = ""
+    displacements: NDArray[np.float64] | None = None  # (n_nodes, 3) raw Ux, Uy, Uz.
+    scale: float = 1.0
+    combos: list[str] | None = None  # Combo names, indexed by the *_combos arrays.
+    value_combos: NDArray[np.int32] | None = None  # (n_members,) index into combos, -1 for none.
+    displacement_combos: NDArray[np.int32] | None = None  # (n_nodes, 3) index into combos, -1 for none.
+
+    def to_dict(self) -> dict[str, Any]:
+        """Overlay as a document for `figure_json.dumps`."""
+        return self._asdict()
+
+    @classmethod
+    def from_dict(cls, data: dict[str, Any]) -> "SceneOverlay":
+        """Overlay of a document read with `figure_json.loads(..., arrays=True)`."""
+        return cls(**data)
+
+
+class Scene(NamedTuple):
+    """3D scene of a tool, kept as its geometry and result overlay until it is drawn."""
+
+    geometry: SceneGeometry
+    overlay: SceneOverlay
+
+    def figure(self, lod_threshold: int | None = None) -> go.Figure:
+        return compose_scene(self.geometry, self.overlay, lod_threshold=lod_threshold)
+
+
+class ViewDocument(NamedTuple):
+    """Serialised output of a tool as it is stored for the view (see app.figure_json):
+    a figure, or the overlay of a 3D scene and the key of its `geometry`, which is
+    stored apart once per model."""
+
+    document: bytes
+    geometry: SceneGeometry | None = None
+
+    @classmethod
+    def from_figure(cls, figure: Scene | go.Figure) -> "ViewDocument":
+        if isinstance(figure, Scene):
+            overlay = {"geometry": figure.geometry.key, "overlay": figure.overlay.to_dict()}
+            return cls(figure_json.dumps({"scene": overlay}), figure.geometry)
+        return cls(figure_json.figure_document(figure))
+
+
+def compose_scene(geometry: SceneGeometry, overlay: SceneOverlay, lod_threshold: int | None = None) -> go.Figure:
+    """Plot ETABS 3D model using rectangular cross sections, with the result of the overlay:
+    displaced nodes and beams colored by their value, with a colorbar."""
+    coords = geometry.coords
+    node_texts = [f"Node {node_id}" for node_id in geometry.node_ids.tolist()]
+    if overlay.displacements is not None:
+        raw_disp = np.array(overlay.displacements, dtype=np.float64).reshape(-1, 3)
+        coords = coords + raw_disp * overlay.scale
+        # Hover text with the raw displacements.
+        if overlay.displacement_combos is None:
+            node_texts = [
+                f"{text}<br>Ux: {raw_dx:.4f} mm<br>Uy: {raw_dy:.4f} mm<br>Uz: {raw_dz:.4f} mm"
+                for text, (raw_dx, raw_dy, raw_dz) in zip(node_texts, raw_disp.tolist())
+            ]
+        else:
+            # With the combo that governs each component of an envelope.
+            names = _combo_names(overlay.combos, overlay.displacement_combos).reshape(-1, 3).tolist()
+            node_texts = [
+                f"{text}<br>Ux: {raw_dx:.4f} mm ({combo_x})<br>Uy: {raw_dy:.4f} mm ({combo_y})"
+                f"<br>Uz: {raw_dz:.4f} mm ({combo_z})"
+                for text, (raw_dx, raw_dy, raw_dz), (combo_x, combo_y, combo_z) in zip(
+                    node_texts, raw_disp.tolist(), names
+                )
+            ]
+    has_result = overlay.values is not None
+    x_values, y_values, z_values = coords.T.tolist()
     
     # Compute the min, max, and range for each axis.
     x_min, x_max = min(x_values), max(x_values)
@@ -121,27 +273,68 @@ def plot_3d_scene(nodes: dict[str, Node], lines: dict[str, Frame]) -> go.Figure:
     # Create the figure.
     fig = go.Figure()
     
-    # Add node markers.
+    # Add node markers, larger when a result is shown.
     fig.add_trace(go.Scatter3d(
         x=x_values,
         y=y_values,
         z=z_values,
         mode='markers',
-        marker=dict(size=1, color='blue'),
-        text=[f"Node {node['id']}" for node in nodes.values()],
-        hoverinfo='text'
+        marker=dict(size=3 if has_result else 1, color='blue'),
+        text=node_texts,
+        hoverinfo='text',
+        **(dict(showlegend=False) if has_result else {})
     ))
     
-    # Render each frame as a beam using keys "nodeI" and "nodeJ".
-    for frame in lines.values():
-        node1 = nodes[str(frame["nodeI"])]
-        node2 = nodes[str(frame["nodeJ"])]
-        
-        A = np.array([node1["x"], node1["y"], node1["z"]])
-        B = np.array([node2["x"], node2["y"], node2["z"]])
-        
-        vertices = compute_beam_vertices(A, B, width=300)
-        add_beam_mesh(fig, vertices, color="teal")
+    # Render the frames as beams between the coordinates of their end joints,
+    # colored by their value with the jet colormap.
+    color = jet_colors(np.asarray(overlay.values, dtype=np.float64), overlay.cmin, overlay.cmax) if has_result else "teal"
+    add_beams(
+        fig,
+        coords[geometry.connectivity[:, 0]],
+        coords[geometry.connectivity[:, 1]],
+        color=color,
+        lod_threshold=lod_threshold,
+    )
+
+    if has_result and overlay.value_combos is not None:
+        # Hover text of the members of an envelope, with the combo that governs them,
+        # on invisible markers at their midpoints.
+        midpoints = coords[geometry.connectivity].mean(axis=1)
+        names = _combo_names(overlay.combos, overlay.value_combos).tolist()
+        fig.add_trace(go.Scatter3d(
+            x=midpoints[:, 0],
+            y=midpoints[:, 1],
+            z=midpoints[:, 2],
+            mode='markers',
+            marker=dict(size=3, opacity=0),
+            text=[
+                f"{overlay.colorbar_title}: {value:.2f}<br>Governing: {combo}"
+                for value, combo in zip(np.asarray(overlay.values, dtype=np.float64).tolist(), names)
+            ],
+            hoverinfo='text',
+            showlegend=False
+        ))
+
+    if has_result:
+        # Add a dummy scatter trace for the colorbar.
+        fig.add_trace(go.Scatter3d(
+            x=[0, 0],
+            y=[0, 0],
+            z=[0, 0],
+            mode='markers',
+            marker=dict(
+                color=[overlay.cmin, overlay.cmax],
+                colorscale='jet',
+                colorbar=dict(
+                    title=overlay.colorbar_title,
+                ),
+                size=0,
+                opacity=0,
+                showscale=True
+            ),
+            showlegend=False,
+            hoverinfo='none'
+        ))
     
     # Define a camera view.
     camera = dict(
@@ -182,13 +375,18 @@ def plot_3d_scene(nodes: dict[str, Node], lines: dict[str, Frame]) -> go.Figure:
             bgcolor='white'
         ),
         paper_bgcolor='white',
-        autosize=True,
-
-        margin=dict(l=0, r=0, t=0, b=0)
+        # Leave room for the colorbar title when a result is shown.
+        **(dict(margin=dict(l=0, r=0, t=30, b=0)) if has_result else dict(autosize=True, margin=dict(l=0, r=0, t=0, b=0)))
     )
     return fig
 
 
+def _combo_names(combos: list[str] | None, codes: NDArray[np.int32]) -> NDArray[np.str_]:
+    """Names of the combos of an overlay for an array of codes, "-" for -1."""
+    names = np.array([*(combos or []), "-"])
+    return names[np.asarray(codes, dtype=np.int64)]
+
+
 def default_blank_scene()->go.Figure:
     """Fallback scene when there is no Plotly objects to plot!"""
     fig = go.Figure()
@@ -0,0 +1,135 @@
+"""Benchmark of the entity construction step of `app.parse_xlsx.get_entities`.
+
+Compares the previous row-by-row (`iterrows`) implementation with the column
+based one on a synthetic model. Reading the workbook with `pd.read_excel` is the
+same for both, so the sheets are generated in memory. Importing `app` creates
+the OpenAI client, so the `.env` with OPENAI_API_KEY must be present.
+
+    python -m benchmarks.bench_ingest --nx 50 --ny 50 --stories 19
+"""
+import argparse
+import time
+import pandas as pd  # type: ignore
+
+from typing import Any, Callable
+from app.models import Node, Frame, Section
+from app.parse_xlsx import (
+    get_nodes,
+    get_frames,
+    get_sections,
+    get_displacements,
+    get_modal_parameters,
+    get_material_bill,
+)
+from benchmarks.synthetic_model import synthetic_sheets
+
+
+def legacy_entities(sheets_data: dict[str, pd.DataFrame]) -> tuple:
+    """Row by row implementation this benchmark compares against."""
+    nodes_dict: dict[str, Node] = {}
+    joints_df = sheets_data["Objects and Elements - Joints"].dropna(
+        subset=["Object Name", "Global X", "Global Y", "Global Z", "Object Type"]
+    )
+    for _, row in joints_df.iterrows():
+        if row["Object Type"] == "Joint":
+            node_id = int(row["Object Name"])
+            node = Node(id=node_id, x=float(row["Global X"]), y=float(row["Global Y"]), z=float(row["Global Z"]))
+            nodes_dict.update({str(node_id): node})
+
+    frame_dicts: dict[str, Frame] = {}
+    element_frames_df = pd.concat(
+        [sheets_data["Column Object Connectivity"], sheets_data["Beam Object Connectivity"]],
+        ignore_index=True,
+    ).dropna(subset=["Unique Name", "UniquePtI", "UniquePtJ"])
+    for _, row in element_frames_df.iterrows():
+        if not isinstance(row["Unique Name"], str):
+            frame_id = int(row["Unique Name"])
+            frame = Frame(id=frame_id, nodeI=int(row["UniquePtI"]), nodeJ=int(row["UniquePtJ"]))
+            frame_dicts.update({str(frame_id): frame})
+
+    section_dicts: dict[str, dict] = {}
+    sections_df = sheets_data["Frame Assigns - Sect Prop"].dropna(subset=["Section Property", "UniqueName"])
+    for section_name in sections_df["Section Property"].unique():
+        frame_ids = sections_df[sections_df["Section Property"] == section_name]["UniqueName"].tolist()
+        section_dicts.update({section_name: Section(name=section_name, frame_ids=frame_ids).model_dump()})
+
+    df_disp = sheets_data["Joint Displacements"]
+    df_disp = df_disp[df_disp["Case Type"] == "Combination"]
+    joint_disp_dict: dict[str, dict[str, list[dict[str, Any]]]] = {}
+    for (unique_name, output_case), group in df_disp.groupby(["Unique Name", "Output Case"]):
+        unique_name = str(int(unique_name))
+        joint_disp_dict.setdefault(unique_name, {})
+        joint_disp_dict[unique_name][output_case] = [
+            dict(Ux=row["Ux"], Uy=row["Uy"], Uz=row["Uz"]) for _, row in group.iterrows()
+        ]
+
+    modal_rows = []
+    for index, row in sheets_data["Modal Periods And Frequencies"].iterrows():
+        if index > 0:
+            modal_rows.append(f"| {row['Mode']} | {round(row['Period'], 2)} | {round(row['Frequency'], 2)} |")
+
+    material_rows = []
+    for index, row in sheets_data["Material List by Section Prop"].fillna("-").iterrows():
+        if index > 0 and not isinstance(row["Length"], str):
+            material_rows.append(
+                f"| {row['Section']} | {row['Object Type']} | {row['Number Pieces']} | "
+                f"{round(row['Length'], 2)} | {round(row['Weight'], 2)} | "
+            )
+    return nodes_dict, frame_dicts, section_dicts, joint_disp_dict, modal_rows, material_rows
+
+
+def columnar_entities(sheets_data: dict[str, pd.DataFrame]) -> tuple:
+    """Current implementation, including the dict views built from the arrays."""
+    node_ids, coords = get_nodes(sheets_data)
+    nodes_dict = {
+        str(node_id): Node(id=node_id, x=x, y=y, z=z)
+        for node_id, (x, y, z) in zip(node_ids.tolist(), coords.tolist())
+    }
+    frame_ids, connectivity = get_frames(sheets_data)
+    frame_dicts = {
+        str(frame_id): Frame(id=frame_id, nodeI=node_i, nodeJ=node_j)
+        for frame_id, (node_i, node_j) in zip(frame_ids.tolist(), connectivity.tolist())
+    }
+    return (
+        nodes_dict,
+        frame_dicts,
+        get_sections(sheets_data),
+        get_displacements(sheets_data),
+        get_modal_parameters(sheets_data),
+        get_material_bill(sheets_data),
+    )
+
+
+def best_of(fun: Callable[[], Any], repeat: int) -> float:
+    """Best wall time of `repeat` runs in seconds."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fun()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nx", type=int, default=50)
+    parser.add_argument("--ny", type=int, default=50)
+    parser.add_argument("--stories", type=int, default=19)
+    parser.add_argument("--combos", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    sheets = synthetic_sheets(nx=args.nx, ny=args.ny, stories=args.stories, n_combos=args.combos)
+    n_joints = args.nx * args.ny * (args.stories + 1)
+    n_frames = len(sheets["Column Object Connectivity"]) + len(sheets["Beam Object Connectivity"]) - 2
+    print(f"Synthetic model: {n_joints} joints, {n_frames} frames, {args.combos} combos")
+
+    new = best_of(lambda: columnar_entities(sheets), args.repeat)
+    print(f"columnar : {new:8.3f} s")
+    old = best_of(lambda: legacy_entities(sheets), 1)
+    print(f"iterrows : {old:8.3f} s")
+    print(f"speedup  : {old / new:8.1f} x")
+
+
+if __name__ == "__main__":
+    main()
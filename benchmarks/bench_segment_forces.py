@@ -0,0 +1,179 @@
+"""Benchmark of the internal load plots against the original dict based implementation.
+
+The original code parsed the element forces into nested dicts (frame, combo and
+station to a list of force entries) and, on every internal load plot, split the
+frames at their stations and aggregated the forces of every segment for all combos
+in Python (`legacy_station_point`). The current code parses the forces into the
+columnar `app.results.InternalForces`, builds the station mesh once per model and
+aggregates only the plotted combo, `app.tools.render_internal_loads.station_forces`.
+Importing `app` creates the OpenAI client, so the `.env` with OPENAI_API_KEY must
+be present.
+
+    python -m benchmarks.bench_segment_forces --nx 50 --ny 50 --stories 19
+"""
+import argparse
+import math
+import time
+import numpy as np
+import pandas as pd  # type: ignore
+
+from numpy.typing import NDArray
+from app.geometry import StationMesh
+from app.models import Node, Frame
+from app.parse_xlsx import get_geometry, get_internal_loads
+from app.results import FORCE_COMPONENTS
+from app.tools.render_internal_loads import station_forces
+from benchmarks.bench_ingest import best_of
+from benchmarks.synthetic_model import synthetic_sheets
+
+# frame unique name -> combo -> station -> force entries, as the original code stored them.
+LegacyForces = dict[str, dict[str, dict[float, list[dict[str, float]]]]]
+
+
+def legacy_internal_loads(sheets_data: dict[str, pd.DataFrame]) -> LegacyForces:
+    """Original parse of the element forces sheets into nested dicts."""
+    element_forces = pd.concat(
+        [sheets_data["Element Forces - Beams"], sheets_data["Element Forces - Columns"]], ignore_index=True
+    )
+    df_combination = element_forces[element_forces["Case Type"] == "Combination"]
+    comb_forces_dict: LegacyForces = {}
+    for (unique_name, output_case, station), group in df_combination.groupby(["Unique Name", "Output Case", "Station"]):
+        unique_name = str(int(unique_name))
+        comb_forces_dict.setdefault(unique_name, {}).setdefault(output_case, {})
+        comb_forces_dict[unique_name][output_case][station] = [
+            {key: row[key] for key in FORCE_COMPONENTS} for _, row in group.iterrows()
+        ]
+    return comb_forces_dict
+
+
+def legacy_aggregate_force_entries(
+    force_list_a: list[dict[str, float]], force_list_b: list[dict[str, float]]
+) -> dict[str, float]:
+    """Original max-abs of each component over the entries of two stations."""
+    result = {}
+    for key in FORCE_COMPONENTS:
+        candidates = [entry[key] for entry in force_list_a] + [entry[key] for entry in force_list_b]
+        result[key] = max(candidates, key=abs) if candidates else 0.0
+    return result
+
+
+def legacy_station_point(
+    nodes: dict[str, Node], lines: dict[str, Frame], comb_forces: LegacyForces
+) -> tuple[dict[str, Node], dict[str, Frame], dict[str, dict[str, list[dict[str, float]]]]]:
+    """Original discretisation of the frames at their stations, aggregating the forces
+    of every segment for all combos. Updates and returns `nodes` and `lines`."""
+    max_node_id = max(int(nid) for nid in nodes.keys())
+    max_line_id = max(int(lid) for lid in lines.keys())
+    first_key_frame = next(iter(comb_forces))
+    first_load_case = next(iter(comb_forces[first_key_frame]))
+    new_comb_forces: dict[str, dict] = {}
+
+    for line_id in list(lines.keys()):
+        node_i = lines[line_id]["nodeI"]
+        node_j = lines[line_id]["nodeJ"]
+        node_i_coords = nodes[str(node_i)]
+        node_j_coords = nodes[str(node_j)]
+        dx = node_j_coords["x"] - node_i_coords["x"]
+        dy = node_j_coords["y"] - node_i_coords["y"]
+        dz = node_j_coords["z"] - node_i_coords["z"]
+        line_length = math.sqrt(dx**2 + dy**2 + dz**2)
+        if line_length == 0 or line_id not in comb_forces:
+            continue
+        unit_dx, unit_dy, unit_dz = dx / line_length, dy / line_length, dz / line_length
+        sorted_station_keys = sorted(comb_forces[line_id][first_load_case].keys(), key=lambda s: float(s))
+        if len(sorted_station_keys) < 2:
+            continue
+        del lines[line_id]
+
+        aggregated_forces_by_load: dict[str, list[dict[str, float]]] = {}
+        for load_case, station_data in comb_forces[line_id].items():
+            aggregated_forces_by_load[load_case] = [
+                legacy_aggregate_force_entries(station_data[key_a], station_data[key_b])
+                for key_a, key_b in zip(sorted_station_keys, sorted_station_keys[1:])
+            ]
+
+        new_node_ids: dict[int, int] = {}
+        for idx in range(1, len(sorted_station_keys) - 1):
+            station_val = float(sorted_station_keys[idx])
+            max_node_id += 1
+            nodes[str(max_node_id)] = {
+                "id": max_node_id,
+                "x": node_i_coords["x"] + station_val * unit_dx,
+                "y": node_i_coords["y"] + station_val * unit_dy,
+                "z": node_i_coords["z"] + station_val * unit_dz,
+            }
+            new_node_ids[idx] = max_node_id
+
+        for i in range(len(sorted_station_keys) - 1):
+            start_node = node_i if i == 0 else new_node_ids[i]
+            end_node = new_node_ids.get(i + 1, node_j)
+            max_line_id += 1
+            new_line_id = str(max_line_id)
+            lines[new_line_id] = {"id": max_line_id, "nodeI": start_node, "nodeJ": end_node}
+            new_comb_forces[new_line_id] = {
+                load_case: [seg_forces[i]] for load_case, seg_forces in aggregated_forces_by_load.items()
+            }
+    return nodes, lines, new_comb_forces
+
+
+def legacy_plot_forces(
+    nodes: dict[str, Node], lines: dict[str, Frame], comb_forces: LegacyForces, load_case: str
+) -> dict[str, NDArray[np.float64]]:
+    """Forces of every line of an original internal load plot of a load case: the
+    (6, n_lines) P, V2, V3, T, M2, M3 in line order, keyed like `station_forces`."""
+    _, lines, new_comb_forces = legacy_station_point(dict(nodes), dict(lines), comb_forces)
+    case_forces = np.zeros((len(FORCE_COMPONENTS), len(lines)), dtype=np.float64)
+    for line, line_id in enumerate(lines):
+        if load_case in new_comb_forces.get(line_id, {}):
+            entry = new_comb_forces[line_id][load_case][0]
+            case_forces[:, line] = [entry[key] for key in FORCE_COMPONENTS]
+    return {load_case: case_forces}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--nx", type=int, default=50)
+    parser.add_argument("--ny", type=int, default=50)
+    parser.add_argument("--stories", type=int, default=19)
+    parser.add_argument("--combos", type=int, default=3)
+    parser.add_argument("--stations", type=int, default=3)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    sheets = synthetic_sheets(
+        nx=args.nx, ny=args.ny, stories=args.stories, n_combos=args.combos, n_stations=args.stations
+    )
+    geometry = get_geometry(sheets)
+    nodes, frames = geometry.nodes_dict(), geometry.frames_dict()
+
+    start = time.perf_counter()
+    legacy_forces = legacy_internal_loads(sheets)
+    legacy_parse = time.perf_counter() - start
+    start = time.perf_counter()
+    forces = get_internal_loads(sheets)
+    columnar_parse = time.perf_counter() - start
+    start = time.perf_counter()
+    mesh = StationMesh.from_forces(geometry, forces)
+    mesh_build = time.perf_counter() - start
+    combo = forces.combos[0]
+    print(
+        f"Synthetic model: {len(forces.frame_ids)} frames, {args.stations} stations, "
+        f"{len(mesh.segment_frames)} segments, {args.combos} combos"
+    )
+
+    new = station_forces(mesh, forces, [combo])[combo]
+    old = legacy_plot_forces(nodes, frames, legacy_forces, combo)[combo]
+    assert np.array_equal(new, old), "The implementations disagree."
+
+    vectorised = best_of(lambda: station_forces(mesh, forces, [combo]), args.repeat)
+    original = best_of(lambda: legacy_plot_forces(nodes, frames, legacy_forces, combo), 1)
+    print(f"parse, dicts    : {legacy_parse:8.3f} s")
+    print(f"parse, columnar : {columnar_parse:8.3f} s")
+    print(f"station mesh    : {mesh_build:8.3f} s (once per model)")
+    print(f"plot, dicts     : {original:8.3f} s")
+    print(f"plot, columnar  : {vectorised:8.3f} s")
+    print(f"speedup         : {legacy_parse / columnar_parse:8.1f} x parse, {original / vectorised:.1f} x per plot")
+
+
+if __name__ == "__main__":
+    main()
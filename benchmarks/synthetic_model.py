@@ -0,0 +1,176 @@
+"""Synthetic ETABS export used by the benchmarks and the tests.
+
+Builds a regular grid building (columns on an nx x ny grid, beams in both
+directions on every story) and returns the sheets with the same layout as
+`app.parse_xlsx.Workbook`: the header row followed by the units row.
+"""
+import io
+import zipfile
+import numpy as np
+import pandas as pd  # type: ignore
+
+
+def _with_units(columns: dict[str, np.ndarray | list], units: dict[str, str]) -> pd.DataFrame:
+    """DataFrame whose first row is the ETABS units row."""
+    df = pd.DataFrame(columns)
+    units_row = pd.DataFrame([{col: units.get(col) for col in df.columns}])
+    return pd.concat([units_row, df], ignore_index=True)
+
+
+def synthetic_sheets(
+    nx: int = 50,
+    ny: int = 50,
+    stories: int = 19,
+    n_combos: int = 3,
+    n_stations: int = 3,
+    bay: float = 6000.0,
+    story_height: float = 3500.0,
+    seed: int = 0,
+) -> dict[str, pd.DataFrame]:
+    """Sheets of a synthetic model with nx * ny * (stories + 1) joints."""
+    rng = np.random.default_rng(seed)
+    combos = [f"COMB{i + 1}" for i in range(n_combos)]
+
+    # Joints.
+    gx, gy, gz = np.meshgrid(np.arange(nx), np.arange(ny), np.arange(stories + 1), indexing="ij")
+    joint_ids = np.arange(1, gx.size + 1)
+    joint_index = joint_ids.reshape(gx.shape)
+    x = gx.ravel() * bay
+    y = gy.ravel() * bay
+    z = gz.ravel() * story_height
+    story_names = np.array([f"Story{k}" for k in range(stories + 1)])[gz.ravel()]
+    joints = _with_units(
+        {
+            "Story": story_names,
+            "Element Name": joint_ids,
+            "Object Type": "Joint",
+            "Object Name": joint_ids,
+            "Global X": x,
+            "Global Y": y,
+            "Global Z": z,
+        },
+        {"Global X": "mm", "Global Y": "mm", "Global Z": "mm"},
+    )
+
+    # Frames: columns first, then beams along x and y.
+    col_i = joint_index[:, :, :-1].ravel()
+    col_j = joint_index[:, :, 1:].ravel()
+    beam_i = np.concatenate([joint_index[:-1, :, 1:].ravel(), joint_index[:, :-1, 1:].ravel()])
+    beam_j = np.concatenate([joint_index[1:, :, 1:].ravel(), joint_index[:, 1:, 1:].ravel()])
+    col_ids = np.arange(1, col_i.size + 1)
+    beam_ids = np.arange(col_i.size + 1, col_i.size + beam_i.size + 1)
+    columns = _with_units(
+        {"Story": "Story", "Column": col_ids, "Unique Name": col_ids,
+         "UniquePtI": col_i, "UniquePtJ": col_j, "Length": story_height},
+        {"Length": "mm"},
+    )
+    beams = _with_units(
+        {"Story": "Story", "Beam": beam_ids, "Unique Name": beam_ids,
+         "UniquePtI": beam_i, "UniquePtJ": beam_j, "Length": bay},
+        {"Length": "mm"},
+    )
+    frame_ids = np.concatenate([col_ids, beam_ids])
+    sect_prop = _with_units(
+        {"Story": "Story", "Label": frame_ids, "UniqueName": frame_ids,
+         "Section Property": np.where(frame_ids <= col_ids[-1], "C600X600", "B300X600")},
+        {},
+    )
+    groups = _with_units({"Group Name": ["All"], "Object Type": ["Frame"], "Object Label": [1]}, {})
+
+    def element_forces(ids: np.ndarray, length: float, label: str) -> pd.DataFrame:
+        stations = np.linspace(0.0, length, n_stations)
+        n = ids.size * n_combos * n_stations
+        name = np.repeat(ids, n_combos * n_stations)
+        case = np.tile(np.repeat(combos, n_stations), ids.size)
+        station = np.tile(stations, ids.size * n_combos)
+        values = {key: rng.normal(0.0, 100.0, n) for key in ("P", "V2", "V3", "T", "M2", "M3")}
+        return _with_units(
+            {"Story": "Story", label: name, "Unique Name": name, "Output Case": case,
+             "Case Type": "Combination", "Station": station, **values},
+            {"Station": "mm", "P": "kN", "V2": "kN", "V3": "kN", "T": "kN-m", "M2": "kN-m", "M3": "kN-m"},
+        )
+
+    forces_columns = element_forces(col_ids, story_height, "Column")
+    forces_beams = element_forces(beam_ids, bay, "Beam")
+
+    # Joint forces are only used for the list of load combos.
+    joint_forces = _with_units(
+        {"Story": "Story", "Frame": np.repeat(col_ids[:nx * ny], n_combos),
+         "Unique Name": np.repeat(col_ids[:nx * ny], n_combos),
+         "Output Case": np.tile(combos, nx * ny), "Case Type": "Combination",
+         "F1": rng.normal(0.0, 10.0, nx * ny * n_combos)},
+        {"F1": "kN"},
+    )
+
+    # Displacements for every joint and combo, increasing with height.
+    disp_ids = np.repeat(joint_ids, n_combos)
+    height = np.repeat(z, n_combos) / max(z.max(), 1.0)
+    displacements = _with_units(
+        {"Story": "Story", "Label": disp_ids, "Unique Name": disp_ids,
+         "Output Case": np.tile(combos, joint_ids.size), "Case Type": "Combination",
+         "Ux": height * rng.normal(10.0, 2.0, disp_ids.size),
+         "Uy": height * rng.normal(5.0, 1.0, disp_ids.size),
+         "Uz": height * rng.normal(-1.0, 0.2, disp_ids.size)},
+        {"Ux": "mm", "Uy": "mm", "Uz": "mm"},
+    )
+
+    # Reactions at the base joints.
+    base_ids = joint_index[:, :, 0].ravel()
+    reac_ids = np.repeat(base_ids, n_combos)
+    reactions = _with_units(
+        {"Story": "Base", "Joint Label": reac_ids, "Unique Name": reac_ids,
+         "Output Case": np.tile(combos, base_ids.size), "Case Type": "Combination",
+         "FX": rng.normal(0.0, 10.0, reac_ids.size), "FY": rng.normal(0.0, 10.0, reac_ids.size),
+         "FZ": rng.uniform(500.0, 3000.0, reac_ids.size)},
+        {"FX": "kN", "FY": "kN", "FZ": "kN"},
+    )
+
+    modes = np.arange(1, 13)
+    periods = 2.0 / modes
+    modal = _with_units(
+        {"Case": "Modal", "Mode": modes, "Period": periods, "Frequency": 1.0 / periods},
+        {"Period": "sec", "Frequency": "cyc/sec"},
+    )
+    material = _with_units(
+        {"Section": ["C600X600", "B300X600"], "Object Type": ["Column", "Beam"],
+         "Number Pieces": [col_ids.size, beam_ids.size],
+         "Length": [col_ids.size * story_height, beam_ids.size * bay],
+         "Weight": [col_ids.size * 30.0, beam_ids.size * 15.0]},
+        {"Length": "mm", "Weight": "kN"},
+    )
+
+    return {
+        "Objects and Elements - Joints": joints,
+        "Group Assignments": groups,
+        "Beam Object Connectivity": beams,
+        "Frame Assigns - Sect Prop": sect_prop,
+        "Element Joint Forces - Frame": joint_forces,
+        "Column Object Connectivity": columns,
+        "Element Forces - Beams": forces_beams,
+        "Element Forces - Columns": forces_columns,
+        "Joint Displacements": displacements,
+        "Joint Reactions": reactions,
+        "Modal Periods And Frequencies": modal,
+        "Material List by Section Prop": material,
+    }
+
+
+def synthetic_workbook(sheets: dict[str, pd.DataFrame]) -> bytes:
+    """Write the sheets as an ETABS-like .xlsx: a title row, the header and the data."""
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        for name, df in sheets.items():
+            pd.DataFrame([[f"TABLE:  {name}"]]).to_excel(
+                writer, sheet_name=name, header=False, index=False
+            )
+            df.to_excel(writer, sheet_name=name, startrow=1, index=False)
+    return buffer.getvalue()
+
+
+def synthetic_csv_zip(sheets: dict[str, pd.DataFrame]) -> bytes:
+    """Write the sheets as a zip of ETABS-like .csv tables: a title line, the header and the data."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+        for name, df in sheets.items():
+            archive.writestr(f"{name}.csv", f"TABLE:  {name}\n" + df.to_csv(index=False))
+    return buffer.getvalue()
@@ -0,0 +1,20 @@
+import numpy as np
+
+from typing import Any
+
+
+def assert_same(actual: Any, expected: Any, rtol: float = 0.0) -> None:
+    """Assert two entities fields are equal: stores field by field, arrays by value
+    (within `rtol` for floats) and everything else with ==."""
+    if isinstance(expected, tuple) and hasattr(expected, "_fields"):
+        assert type(actual) is type(expected)
+        for name in expected._fields:
+            assert_same(getattr(actual, name), getattr(expected, name), rtol)
+    elif isinstance(expected, np.ndarray):
+        assert actual.shape == expected.shape and actual.dtype == expected.dtype
+        if expected.dtype.kind == "f":
+            np.testing.assert_allclose(actual, expected, rtol=rtol, atol=0)
+        else:
+            np.testing.assert_array_equal(actual, expected)
+    else:
+        assert actual == expected
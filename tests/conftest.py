@@ -0,0 +1,23 @@
+import os
+
+# Importing app creates the OpenAI client, which needs a key but sends no request here.
+os.environ.setdefault("OPENAI_API_KEY", "test")
+# Uploads in the tests are parsed again instead of filling the shared on-disk cache.
+os.environ.setdefault("PARSE_CACHE_MAX_BYTES", "0")
+
+import pytest  # noqa: E402
+
+from app.entities import Entities  # noqa: E402
+from benchmarks.synthetic_model import synthetic_sheets  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def sheets():
+    """Sheets of a small synthetic model, as a dict of DataFrames."""
+    return synthetic_sheets(nx=3, ny=2, stories=2, n_combos=3, n_stations=3)
+
+
+@pytest.fixture
+def entities(sheets):
+    """Entities of the synthetic model, without on-disk parse cache."""
+    return Entities(sheets)
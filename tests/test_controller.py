@@ -0,0 +1,86 @@
+import io
+import logging
+import viktor as vkt  # type: ignore
+
+from types import SimpleNamespace
+from app import controller, prewarm
+from app.controller import CHAT_ERROR_MESSAGE, forget_base_scene, store_base_scene, stream_chat
+from app.entities import Entities
+from app.llm_engine import Response
+from benchmarks.synthetic_model import synthetic_workbook
+
+
+def failing_responses():
+    yield Response(response="Let me check", selected_tool=None)
+    raise RuntimeError("connection lost")
+
+
+def test_stream_chat_reports_errors_in_the_chat(caplog):
+    with caplog.at_level(logging.ERROR, logger="app.controller"):
+        text = "".join(stream_chat(failing_responses(), None))
+    assert text == f"Let me check\n\n{CHAT_ERROR_MESSAGE}"
+    assert "connection lost" in caplog.text
+
+
+def test_base_scene_is_stored_once_per_entity_and_upload(sheets, monkeypatch):
+    stored = []
+    monkeypatch.setattr(controller, "store_scene", stored.append)
+    first, second = Entities(sheets, content_hash="first"), Entities(sheets, content_hash="second")
+    for entities, entity_id in [(first, 1), (first, 1), (first, 2), (second, 1), (first, 1)]:
+        store_base_scene(entities, entity_id)
+    # Entity 1 switched uploads twice, entity 2 shares the first upload.
+    assert len(stored) == 4
+    # Without an entity id there is no key to remember the scene by.
+    store_base_scene(first, None)
+    store_base_scene(first, None)
+    assert len(stored) == 6
+    # Removing the file of entity 1 does not touch the scene of entity 2.
+    forget_base_scene(1)
+    store_base_scene(first, 2)
+    assert len(stored) == 6
+    store_base_scene(first, 1)
+    assert len(stored) == 7
+
+
+class Upload:
+    """Stand-in for the vkt.FileResource of an uploaded file."""
+
+    def __init__(self, content: bytes) -> None:
+        self.file = self
+        self.filename = "model.xlsx"
+        self._content = content
+
+    def open_binary(self) -> io.BytesIO:
+        return io.BytesIO(self._content)
+
+
+class Storage:
+    """Stand-in for an empty vkt.Storage."""
+
+    def list(self, scope: str) -> dict:
+        return {}
+
+    def get(self, key: str, scope: str):
+        raise FileNotFoundError(key)
+
+
+def test_view_renders_start_the_warmup_once(sheets, monkeypatch):
+    pool = prewarm._pool()
+    submitted = []
+    pool_spy = SimpleNamespace(submit=lambda run: submitted.append(pool.submit(run)))
+    monkeypatch.setattr(prewarm, "_pool", lambda: pool_spy)
+    monkeypatch.setattr(controller.vkt, "Storage", Storage)
+    params = SimpleNamespace(xlsx_file=Upload(synthetic_workbook(sheets)))
+    view = controller.Controller()
+    try:
+        # Reading the upload, e.g. for a chat message, does not start it.
+        controller.read_file_binary(params.xlsx_file)
+        assert not submitted
+        for _ in range(2):
+            # The VIKTOR view decorator takes the controller as an argument.
+            assert isinstance(view.get_plotly_view(view, params=params, entity_id=3), vkt.PlotlyResult)
+        assert len(submitted) == 1
+    finally:
+        # Let the warm-up finish inside the test, it logs each step.
+        for future in submitted:
+            future.result(timeout=60)
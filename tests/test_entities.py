@@ -0,0 +1,90 @@
+import numpy as np
+import os
+import pytest
+import threading
+
+from app.entities import FIELD_SHEETS, Entities
+from app.model_file import FIELD_CODECS
+from app.parse_cache import ParseCache
+from app.parse_csv import CsvTables
+from app.parse_xlsx import Workbook
+from benchmarks.synthetic_model import synthetic_csv_zip, synthetic_workbook
+from tests.compare import assert_same
+
+
+def test_fields_are_computed_while_another_field_is_computed(entities):
+    started, release = threading.Event(), threading.Event()
+
+    def slow_parse():
+        started.set()
+        release.wait(30)
+        return "slow"
+
+    worker = threading.Thread(target=entities._field, args=("model_context", slow_parse))
+    worker.start()
+    try:
+        assert started.wait(10)
+        # Another field does not wait for the one being computed.
+        assert entities.list_load_combos
+        assert worker.is_alive()
+    finally:
+        release.set()
+        worker.join(10)
+    assert entities.model_context == "slow"
+
+
+@pytest.fixture(scope="module")
+def workbook_content(sheets):
+    """A small synthetic ETABS export as .xlsx."""
+    return synthetic_workbook(sheets)
+
+
+def test_second_load_is_served_from_the_parse_cache(workbook_content, tmp_path):
+    cache = ParseCache(str(tmp_path), max_bytes=1 << 30)
+    parsed = Entities(Workbook(workbook_content), content_hash="upload", parse_cache=cache).reactions
+    second = Entities(Workbook(workbook_content), content_hash="upload", parse_cache=cache)
+    assert_same(second.reactions, parsed)
+    assert second.reused_fields == ["reactions"]
+    report = second.ingest_report()
+    assert sorted(report["reused"]) == sorted(FIELD_SHEETS["reactions"]) and report["reparsed"] == []
+
+
+def test_changed_sheet_misses_the_parse_cache(sheets, workbook_content, tmp_path):
+    cache = ParseCache(str(tmp_path), max_bytes=1 << 30)
+    first = Entities(Workbook(workbook_content), content_hash="upload", parse_cache=cache)
+    parsed_reactions, parsed_geometry = first.reactions, first.geometry
+    revised_sheets = dict(sheets)
+    reactions = sheets["Joint Reactions"].copy()
+    # Row 0 holds the units.
+    reactions.loc[1:, "FZ"] = reactions["FZ"].iloc[1:].astype(float) + 1.0
+    revised_sheets["Joint Reactions"] = reactions
+    revised = Entities(Workbook(synthetic_workbook(revised_sheets)), content_hash="revised", parse_cache=cache)
+    np.testing.assert_allclose(revised.reactions.component("FZ"), parsed_reactions.component("FZ") + 1.0)
+    assert_same(revised.geometry, parsed_geometry)
+    assert revised.reused_fields == ["geometry"]
+
+
+def test_eviction_keeps_the_parse_cache_under_max_bytes(entities, tmp_path):
+    probe = ParseCache(str(tmp_path / "probe"), max_bytes=1 << 30)
+    probe.set("entry", "reactions", entities.reactions)
+    entry_bytes = sum(f.stat().st_size for f in (tmp_path / "probe" / "entry").iterdir())
+    tmp_path = tmp_path / "cache"
+    cache = ParseCache(str(tmp_path), max_bytes=2 * entry_bytes)
+    for age, key in enumerate(["old", "middle", "new"]):
+        cache.set(key, "reactions", entities.reactions)
+        # Entries are ordered by their modification time, which is coarse on some file systems.
+        os.utime(tmp_path / key, (age, age))
+    entries = sorted(entry.name for entry in tmp_path.iterdir() if entry.is_dir())
+    assert entries == ["middle", "new"]
+    assert sum(f.stat().st_size for key in entries for f in (tmp_path / key).iterdir()) <= cache.max_bytes
+    assert cache.get("old", "reactions") is None
+    assert_same(cache.get("new", "reactions"), entities.reactions)
+
+
+def test_csv_zip_gives_the_entities_of_the_xlsx(sheets, workbook_content):
+    from_xlsx = Entities(Workbook(workbook_content))
+    from_csv = Entities(CsvTables(synthetic_csv_zip(sheets)))
+    assert from_csv.model_context == from_xlsx.model_context
+    for field in FIELD_CODECS:
+        # The synthetic .xlsx keeps fewer digits of the floats than the .csv.
+        assert_same(getattr(from_csv, field), getattr(from_xlsx, field), rtol=1e-12)
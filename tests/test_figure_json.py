@@ -0,0 +1,52 @@
+import json
+import numpy as np
+import plotly.graph_objects as go  # type: ignore
+import pytest
+
+from app import figure_json
+
+
+@pytest.fixture
+def figure():
+    """A 3D scatter with float, integer and short numeric arrays."""
+    rng = np.random.default_rng(0)
+    return go.Figure(go.Scatter3d(
+        x=rng.normal(size=50) * 1000,
+        y=rng.normal(size=50),
+        z=np.arange(50),
+        customdata=rng.normal(size=(50, 3)),
+        marker=dict(color=[0.5, 1.5]),
+    ))
+
+
+@pytest.mark.parametrize("compress_level", [0, 6])
+def test_typed_arrays_decode_to_the_figure_arrays(figure, compress_level):
+    raw = figure_json.figure_document(figure, compress_level=compress_level)
+    trace = figure_json.loads(raw, arrays=True)["data"][0]
+    original = figure.data[0]
+    # Floats are quantised to f4, integers keep their values in the smallest type.
+    np.testing.assert_allclose(trace["x"], original.x, rtol=1e-6)
+    np.testing.assert_allclose(trace["y"], original.y, rtol=1e-6)
+    np.testing.assert_allclose(trace["customdata"], original.customdata, rtol=1e-6)
+    assert trace["z"].dtype == np.int8
+    np.testing.assert_array_equal(trace["z"], original.z)
+    assert trace["marker"]["color"] == [0.5, 1.5]
+
+
+def test_typed_arrays_are_plotly_typed_arrays(figure):
+    trace = json.loads(figure_json.figure_text(figure))["data"][0]
+    assert trace["x"].keys() == {"dtype", "bdata"}
+    assert trace["x"]["dtype"] == "f4"
+    assert trace["customdata"]["shape"] == "50, 3"
+
+
+def test_plain_lists_without_typed_arrays(figure, monkeypatch):
+    monkeypatch.setattr(figure_json, "FIGURE_TYPED_ARRAYS", False)
+    text = figure_json.figure_text(figure)
+    assert "bdata" not in text
+    trace = json.loads(text)["data"][0]
+    original = figure.data[0]
+    # Plain lists keep the floats exact.
+    assert trace["x"] == original.x.tolist()
+    assert trace["z"] == original.z.tolist()
+    assert trace["customdata"] == original.customdata.tolist()
@@ -0,0 +1,66 @@
+import gc
+import io
+import pytest
+import tempfile
+
+from app.entities import export_model
+from app.model_file import FIELD_CODECS, MAGIC, MODEL_FILE_SUFFIX, ModelFile, open_model_file
+from tests.compare import assert_same
+
+
+@pytest.fixture
+def model_content(entities):
+    """Native model file of all fields of the synthetic model."""
+    return export_model(entities)
+
+
+@pytest.fixture
+def model_path(model_content, tmp_path):
+    """The native model file on disk."""
+    path = tmp_path / f"model{MODEL_FILE_SUFFIX}"
+    path.write_bytes(model_content)
+    return str(path)
+
+
+def test_round_trip_every_field(entities, model_content, model_path):
+    for model_file in (ModelFile(model_content), ModelFile(model_path)):
+        assert model_file.content_hash == entities.content_hash
+        assert set(model_file) == set(FIELD_CODECS)
+        for field in FIELD_CODECS:
+            assert_same(model_file.decode(field), getattr(entities, field))
+
+
+def test_mapped_arrays_are_aligned(model_path):
+    model_file = ModelFile(model_path)
+    for field in model_file:
+        for array in model_file[field].values():
+            assert array.ctypes.data % 64 == 0
+
+
+def test_uploaded_stream_is_removed_once_unused(entities, model_content, tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+    model_file = open_model_file(io.BytesIO(model_content))
+    geometry = model_file.decode("geometry")
+    assert_same(geometry, entities.geometry)
+    assert list(tmp_path.glob(f"*{MODEL_FILE_SUFFIX}"))
+    del model_file, geometry
+    gc.collect()
+    assert not list(tmp_path.glob(f"*{MODEL_FILE_SUFFIX}"))
+
+
+@pytest.mark.parametrize("corrupt", [
+    lambda content: b"NOTMODEL" + content[len(MAGIC):],
+    lambda content: content[: len(MAGIC) + 4],
+    lambda content: content[: len(content) // 2],
+    lambda content: content[:-1],
+], ids=["wrong magic", "truncated length", "truncated header or arrays", "truncated last array"])
+def test_corrupt_files_are_rejected(model_content, tmp_path, corrupt):
+    content = corrupt(model_content)
+    path = tmp_path / f"corrupt{MODEL_FILE_SUFFIX}"
+    path.write_bytes(content)
+    with pytest.raises(ValueError):
+        ModelFile(content)
+    with pytest.raises(ValueError):
+        ModelFile(str(path), temporary=True)
+    # Rejected uploads are removed like any other temporary file.
+    assert not path.exists()
@@ -0,0 +1,76 @@
+import numpy as np
+import pytest
+
+from app.geometry import StationMesh
+from app.parse_xlsx import Workbook, get_geometry, get_internal_loads, shutdown_pools
+from app.results import FORCE_COMPONENTS, InternalForces
+from app.tools.render_internal_loads import station_forces
+from benchmarks.bench_segment_forces import legacy_internal_loads, legacy_plot_forces
+from benchmarks.synthetic_model import synthetic_workbook
+
+
+@pytest.fixture(scope="module")
+def workbook_content(sheets):
+    """A small synthetic ETABS export as .xlsx."""
+    return synthetic_workbook(sheets)
+
+
+@pytest.fixture(scope="module")
+def legacy_forces(workbook_content):
+    """Element forces parsed into nested dicts by the original code."""
+    return legacy_internal_loads(Workbook(workbook_content))
+
+
+def as_legacy_dict(forces: InternalForces) -> dict:
+    """The columnar store as the nested dicts of the original code."""
+    comb_forces: dict = {}
+    for frame_code, combo_code, station, values in zip(
+        forces.frame_codes.tolist(), forces.combo_codes.tolist(), forces.stations.tolist(), forces.values.T.tolist()
+    ):
+        frame = str(forces.frame_ids[frame_code])
+        entries = comb_forces.setdefault(frame, {}).setdefault(forces.combos[combo_code], {}).setdefault(station, [])
+        entries.append(dict(zip(FORCE_COMPONENTS, values)))
+    return comb_forces
+
+
+@pytest.mark.parametrize("max_workers", [0, 2])
+@pytest.mark.parametrize("streaming", [False, True])
+def test_internal_loads_match_legacy_parse(workbook_content, legacy_forces, streaming, max_workers):
+    workbook = Workbook(workbook_content, streaming=streaming, chunk_rows=50, max_workers=max_workers)
+    try:
+        forces = get_internal_loads(workbook)
+    finally:
+        shutdown_pools()
+    assert as_legacy_dict(forces) == legacy_forces
+
+
+def test_force_envelope_matches_legacy_parse(workbook_content, legacy_forces):
+    envelope = get_internal_loads(Workbook(workbook_content)).envelope()
+    assert len(envelope.item_ids) == sum(
+        len(legacy_forces[frame][next(iter(legacy_forces[frame]))]) for frame in legacy_forces
+    )
+    for item, (frame_id, station) in enumerate(zip(envelope.item_ids.tolist(), envelope.stations.tolist())):
+        for k, key in enumerate(FORCE_COMPONENTS):
+            candidates = [
+                (entry[key], combo)
+                for combo, stations in sorted(legacy_forces[str(frame_id)].items())
+                for entry in stations.get(station, [])
+            ]
+            expected = {
+                "max": max(candidates, key=lambda c: c[0]),
+                "min": min(candidates, key=lambda c: c[0]),
+                "max_abs": max(candidates, key=lambda c: abs(c[0])),
+            }
+            for kind, (value, combo) in expected.items():
+                assert getattr(envelope, kind)[k, item] == value
+                assert envelope.governing_combos(key, kind)[item] == combo
+
+
+def test_station_forces_match_legacy_plot(workbook_content, legacy_forces):
+    workbook = Workbook(workbook_content)
+    forces = get_internal_loads(workbook)
+    geometry = get_geometry(workbook)
+    mesh = StationMesh.from_forces(geometry, forces)
+    for combo in forces.combos:
+        expected = legacy_plot_forces(geometry.nodes_dict(), geometry.frames_dict(), legacy_forces, combo)
+        assert np.array_equal(station_forces(mesh, forces, [combo])[combo], expected[combo])
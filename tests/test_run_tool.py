@@ -0,0 +1,104 @@
+import numpy as np
+import plotly.graph_objects as go  # type: ignore
+import pytest
+import threading
+import time
+
+from typing import get_args
+from app.entities import Entities
+from app.llm_engine import (
+    DEFAULT_SOIL_PRESSURE,
+    WARMUP_STEPS,
+    PadFoundationDesignForLoadEnvelope,
+    PlotDeformedShape,
+    PlotInternalForces,
+    Response,
+    execute_tool,
+    run_tool,
+)
+from app.prewarm import start_warmup
+from app.results import FORCE_COMPONENTS
+from app.tools.render_internal_loads import station_forces
+from app.tools.render_scene import Scene
+
+TOOL_COMPONENTS = get_args(PlotInternalForces.model_fields["force_component"].annotation)
+
+
+@pytest.mark.parametrize("envelope", [False, True])
+@pytest.mark.parametrize("force_component", TOOL_COMPONENTS)
+def test_plot_internal_forces_every_component(entities, force_component, envelope):
+    load_case = None if envelope else entities.internal_loads.combos[0]
+    tool = PlotInternalForces(load_case=load_case, envelope=envelope, force_component=force_component)
+    scene = run_tool(tool, entities)
+    assert isinstance(scene, Scene)
+    values = scene.overlay.values
+    assert len(values) == len(entities.station_mesh.segment_frames)
+    if force_component in ("V1", "M1"):
+        # Not in the ETABS element forces sheets, plotted as zero.
+        assert not values.any()
+    else:
+        assert np.abs(values).max() > 0
+
+
+def test_envelope_is_not_a_load_case_name(sheets):
+    # A combo named like the envelope is still plotted as that combo.
+    renamed = {
+        name: df.replace({"Output Case": {"COMB1": "Envelope"}}) if "Output Case" in df else df
+        for name, df in sheets.items()
+    }
+    entities = Entities(renamed)
+    assert "Envelope" in entities.internal_loads.combos
+    single = run_tool(PlotInternalForces(load_case="Envelope", force_component="M3"), entities)
+    envelope = run_tool(PlotInternalForces(load_case="Envelope", envelope=True, force_component="M3"), entities)
+    expected = station_forces(entities.station_mesh, entities.internal_loads, ["Envelope"])["Envelope"]
+    assert np.array_equal(single.overlay.values, expected[FORCE_COMPONENTS.index("M3")])
+    assert not np.array_equal(single.overlay.values, envelope.overlay.values)
+
+
+def test_plot_deformed_shape_envelope(entities):
+    tool = PlotDeformedShape(load_case=None, envelope=True, scale_factor=None)
+    scene = run_tool(tool, entities)
+    disp = entities.joints_disp
+    # Every component is its max-abs over the combos, from the combo that governs it.
+    stacked = np.stack([disp.at(combo, entities.geometry.node_ids) for combo in disp.combos])
+    governing = np.abs(stacked).argmax(axis=0)
+    expected = np.take_along_axis(stacked, governing[None], axis=0)[0]
+    assert np.array_equal(scene.overlay.displacements, expected)
+    assert np.array_equal(scene.overlay.displacement_combos, governing)
+    assert scene.overlay.combos == disp.combos
+
+
+def test_foundations_envelope_does_not_wait_for_warmup(sheets):
+    # The warm-up is stuck before the foundations step, the tool renders the plot itself.
+    entities = Entities(sheets, content_hash="stuck-warmup")
+    started, release = threading.Event(), threading.Event()
+
+    def blocked(entities):
+        started.set()
+        release.wait(30)
+
+    warmup = start_warmup(entities, [("blocked", blocked), *WARMUP_STEPS])
+    try:
+        assert warmup is not None and started.wait(10)
+        tool = PadFoundationDesignForLoadEnvelope(soil_pressure=DEFAULT_SOIL_PRESSURE, tools_description="")
+        start = time.perf_counter()
+        assert isinstance(run_tool(tool, entities), go.Figure)
+        assert time.perf_counter() - start < 10
+    finally:
+        release.set()
+        # Let the warm-up finish inside the test, it logs each step.
+        if warmup is not None:
+            warmup.result(WARMUP_STEPS[-1][0], timeout=30)
+
+
+@pytest.mark.parametrize("tool_type", [PlotInternalForces, PlotDeformedShape])
+def test_envelope_calls_ignore_the_load_case_in_the_cache(sheets, tool_type):
+    entities = Entities(sheets, content_hash=f"envelope-cache-{tool_type.__name__}")
+    args = {"force_component": "M3"} if tool_type is PlotInternalForces else {"scale_factor": None}
+    views = []
+    for envelope, combo in [(True, "COMB1"), (True, "COMB2"), (False, "COMB1"), (False, "COMB2")]:
+        tool = tool_type(load_case=combo, envelope=envelope, **args)
+        views.append(execute_tool(Response(selected_tool=tool, response=""), entities)[1])
+    # The second envelope call is served from the cache, single load case calls are not.
+    assert views[1] is views[0]
+    assert views[2] is not views[0] and views[3] is not views[2]